@@ -0,0 +1,486 @@
+"""
+本地模拟的 GitHub Packages API + ghcr.io registry + Docker Hub API，用于压测镜像列表脚本。
+
+模拟的接口：
+- GET /orgs|users/{ns}/packages?package_type=container       （Link 分页，支持 per_page/page）
+- GET /orgs|users/{ns}/packages/container/{name}              （单个包）
+- GET /orgs|users/{ns}/packages/container/{name}/versions     （Link 分页）
+- DELETE /orgs|users/{ns}/packages/container/{name}/versions/{id}  （只计数，不改变数据）
+- GET/HEAD /v2/{repo}/manifests/{ref}                         （标签或 digest，返回 Docker-Content-Digest）
+- GET /v2/{repo}/blobs/{digest}                               （镜像 config）
+- GET /v2/repositories/{ns}/、/v2/repositories/{ns}/{repo}/tags  （Docker Hub，正文中的 count/next 分页）
+- POST /v2/users/login                                        （Docker Hub 登录，返回固定 token）
+- GET /token?service=&scope=...                               （registry token 交换，可含多个 scope）
+
+/v2/ 下的 registry 接口与 ghcr.io 一样要求 Bearer token，缺少或 scope 不符时返回 401 质询。
+- GET /_stats、POST /_reset                                    （请求数、发送字节数）
+
+数据按 (包序号, 版本序号) 确定性生成，不预先占用内存；manifest 和 config 的 digest 可以解码回
+(类型, 包, 版本, 架构)，按 digest 的请求现场重新生成正文，不保存任何正文。可注入延迟和 429。
+
+用法：
+    python mock_registry.py --packages 5000 --versions 200 --latency-ms 20 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+BASE_LAYERS = [(f"sha256:{hashlib.sha256(f'base-layer-{i}'.encode()).hexdigest()}", 30_000_000 + i * 1_000_000)
+               for i in range(3)]
+ARCHES = ("amd64", "arm64")
+KIND_INDEX, KIND_MANIFEST, KIND_CONFIG = 1, 2, 3
+
+
+class SyntheticRegistry:
+    """确定性生成的命名空间数据，以及请求计数。"""
+
+    def __init__(self, packages, versions, untagged_every=3, multiarch_every=4, seed=0):
+        self.packages = packages
+        self.versions = versions
+        self.untagged_every = untagged_every
+        self.multiarch_every = multiarch_every
+        self.seed = seed
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.status_counts = {}
+
+    def count(self, status, nbytes):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += nbytes
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.status_counts = {}
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "bytes_sent": self.bytes_sent,
+                    "status_counts": {str(k): v for k, v in self.status_counts.items()}}
+
+    # --- 数据生成 ---
+    @staticmethod
+    def package_name(p):
+        return f"pkg-{p:05d}"
+
+    @staticmethod
+    def package_index(name):
+        match = re.fullmatch(r"pkg-(\d+)", name)
+        return int(match.group(1)) if match else None
+
+    def package(self, p):
+        return {
+            "id": p + 1,
+            "name": self.package_name(p),
+            "package_type": "container",
+            "created_at": "2024-01-01T00:00:00Z",
+            "updated_at": f"2024-06-{1 + p % 28:02d}T00:00:00Z",
+        }
+
+    def make_digest(self, kind, p, i, arch=0):
+        """前 28 位十六进制依次编码 (类型, 包, 版本, 架构序号)，其余 36 位由它们哈希补齐。"""
+        prefix = f"{kind:02x}{p:012x}{i:012x}{arch:02x}"
+        return f"sha256:{prefix}{hashlib.sha256(f'{self.seed}-{prefix}'.encode()).hexdigest()[:36]}"
+
+    def multiarch(self, p):
+        return bool(self.multiarch_every) and p % self.multiarch_every == 0
+
+    def manifest_digest(self, p, i):
+        return self.make_digest(KIND_INDEX if self.multiarch(p) else KIND_MANIFEST, p, i)
+
+    def _config(self, p, i, arch):
+        return json.dumps({"architecture": ARCHES[arch], "os": "linux",
+                           "config": {"Labels": {"pkg": str(p), "version": str(i)}}}).encode()
+
+    def _image_manifest(self, p, i, arch):
+        config = self._config(p, i, arch)
+        unique = f"sha256:{hashlib.sha256(f'{p}-{i}-{ARCHES[arch]}'.encode()).hexdigest()}"
+        layers = [{"mediaType": "application/vnd.oci.image.layer.v1.tar+gzip", "digest": d, "size": size}
+                  for d, size in BASE_LAYERS]
+        layers.append({"mediaType": "application/vnd.oci.image.layer.v1.tar+gzip", "digest": unique,
+                       "size": 1_000_000 + (p * 7919 + i * 104729) % 5_000_000})
+        manifest = {"schemaVersion": 2, "mediaType": "application/vnd.oci.image.manifest.v1+json",
+                    "config": {"mediaType": "application/vnd.oci.image.config.v1+json",
+                               "digest": self.make_digest(KIND_CONFIG, p, i, arch), "size": len(config)},
+                    "layers": layers}
+        return json.dumps(manifest).encode()
+
+    def manifest_body(self, p, i):
+        if self.multiarch(p):
+            entries = []
+            for arch, name in enumerate(ARCHES):
+                child = self._image_manifest(p, i, arch)
+                entries.append({"mediaType": "application/vnd.oci.image.manifest.v1+json",
+                                "digest": self.make_digest(KIND_MANIFEST, p, i, arch), "size": len(child),
+                                "platform": {"architecture": name, "os": "linux"}})
+            body = json.dumps({"schemaVersion": 2, "mediaType": "application/vnd.oci.image.index.v1+json",
+                               "manifests": entries}).encode()
+        else:
+            body = self._image_manifest(p, i, 0)
+        return body
+
+    def version(self, p, i):
+        body = self.manifest_body(p, i)
+        tags = [] if self.untagged_every and i % self.untagged_every == 0 else [f"v{i}"]
+        if i == self.versions - 1:
+            tags.append("latest")
+        created = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1_700_000_000 + i * 3600))
+        return {
+            "id": p * 1_000_000 + i,
+            "name": self.manifest_digest(p, i),
+            "created_at": created,
+            "updated_at": created,
+            "metadata": {"package_type": "container",
+                         "container": {"tags": tags, "size": len(body) * 1000}},
+        }
+
+    def versions_slice(self, p, start, stop):
+        # 最新的在前：序号从大到小
+        indexes = range(self.versions - 1 - start, max(self.versions - 1 - stop, -1), -1)
+        return [self.version(p, i) for i in indexes]
+
+    def tag_index(self, tag):
+        if tag == "latest":
+            return self.versions - 1
+        match = re.fullmatch(r"v(\d+)", tag)
+        return int(match.group(1)) if match else None
+
+    def by_digest(self, digest):
+        """解码 digest 并重新生成 manifest / config 正文；不是本 registry 生成的 digest 返回 None。"""
+        hex_digest = digest[len("sha256:"):]
+        if not digest.startswith("sha256:") or len(hex_digest) != 64:
+            return None
+        try:
+            kind, p, i, arch = (int(hex_digest[a:b], 16) for a, b in ((0, 2), (2, 14), (14, 26), (26, 28)))
+        except ValueError:
+            return None
+        if p >= self.packages or i >= self.versions or arch >= len(ARCHES) \
+                or digest != self.make_digest(kind, p, i, arch):
+            return None
+        if kind == KIND_INDEX and self.multiarch(p):
+            return self.manifest_body(p, i)
+        if arch and not self.multiarch(p):
+            return None
+        if kind == KIND_MANIFEST:
+            return self._image_manifest(p, i, arch)
+        if kind == KIND_CONFIG:
+            return self._config(p, i, arch)
+        return None
+
+    # --- Docker Hub ---
+    def hub_repository(self, p):
+        return {"name": self.package_name(p), "namespace": "bench", "repository_type": "image",
+                "status": 1, "is_private": False, "last_updated": f"2024-06-{1 + p % 28:02d}T00:00:00.000000Z"}
+
+    def hub_tag(self, p, i, name):
+        """Docker Hub 的标签条目；digest 只用于展示，不与 registry 接口的数据对应。"""
+        def digest(*parts):
+            return f"sha256:{hashlib.sha256('-'.join(map(str, ('hub', p, i) + parts)).encode()).hexdigest()}"
+
+        archs = ("amd64", "arm64") if self.multiarch_every and p % self.multiarch_every == 0 else ("amd64",)
+        size = 90_000_000 + (p * 7919 + i * 104729) % 5_000_000
+        pushed = time.strftime("%Y-%m-%dT%H:%M:%S.123456Z", time.gmtime(1_700_000_000 + i * 3600))
+        images = [{"architecture": arch, "os": "linux", "variant": "v8" if arch == "arm64" else None,
+                   "digest": digest(arch), "size": size, "status": "active", "last_pushed": pushed}
+                  for arch in archs]
+        if len(archs) > 1:
+            images.append({"architecture": "unknown", "os": "unknown", "variant": None,
+                           "digest": digest("attestation"), "size": 0, "status": "active"})
+        return {"name": name, "digest": digest("index") if len(archs) > 1 else images[0]["digest"],
+                "full_size": size, "images": images, "last_updated": pushed, "tag_last_pushed": pushed,
+                "tag_status": "active", "v2": True}
+
+    def hub_tags_slice(self, p, start, stop):
+        # 与 Docker Hub 一样按推送时间倒序：latest 在最前，然后 v{versions-1} ... v0
+        tags = []
+        for k in range(start, stop):
+            i = self.versions - 1 if k == 0 else self.versions - k
+            tags.append(self.hub_tag(p, i, "latest" if k == 0 else f"v{i}"))
+        return tags
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    registry = None
+    latency = 0.0
+    error_rate = 0.0
+    retry_after = "0"
+    rng = random.Random(0)
+    rng_lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None, head=False):
+        etag = f'"{hashlib.md5(body).hexdigest()}"' if status == 200 else None
+        if etag and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Length", "0" if head else str(len(body)))
+        self.send_header("X-RateLimit-Limit", "5000")
+        self.send_header("X-RateLimit-Remaining", "4999")
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        if etag:
+            self.send_header("ETag", etag)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        sent = 0
+        if not head and body:
+            self.wfile.write(body)
+            sent = len(body)
+        self.registry.count(status, sent)
+
+    def _send_json(self, status, data, headers=None):
+        headers = dict(headers or {})
+        headers["Content-Type"] = "application/json"
+        self._send(status, json.dumps(data).encode(), headers)
+
+    def _paginate(self, parts, total, make_slice):
+        query = parse_qs(parts.query)
+        per_page = min(int(query.get("per_page", [DEFAULT_PER_PAGE])[0]), MAX_PER_PAGE)
+        page = max(int(query.get("page", ["1"])[0]), 1)
+        last = max(1, -(-total // per_page))
+        items = make_slice((page - 1) * per_page, min(page * per_page, total)) if page <= last else []
+        base = f"http://{self.headers.get('Host')}{parts.path}"
+
+        def link(n, rel):
+            q = {k: v[0] for k, v in query.items()}
+            q["page"] = n
+            q["per_page"] = per_page
+            return f'<{base}?{urlencode(q)}>; rel="{rel}"'
+
+        links = []
+        if page < last:
+            links += [link(page + 1, "next"), link(last, "last")]
+        if page > 1:
+            links += [link(1, "first"), link(page - 1, "prev")]
+        self._send_json(200, items, {"Link": ", ".join(links)} if links else None)
+
+    def _paginate_counted(self, parts, total, make_slice):
+        """Docker Hub 风格的分页：正文中返回 count/next/previous/results。"""
+        query = parse_qs(parts.query)
+        page_size = min(int(query.get("page_size", [10])[0]), MAX_PER_PAGE)
+        page = max(int(query.get("page", ["1"])[0]), 1)
+        last = max(1, -(-total // page_size))
+        items = make_slice((page - 1) * page_size, min(page * page_size, total)) if page <= last else []
+        base = f"http://{self.headers.get('Host')}{parts.path}"
+
+        def link(n):
+            return f"{base}?{urlencode({'page': n, 'page_size': page_size})}"
+
+        self._send_json(200, {"count": total, "next": link(page + 1) if page < last else None,
+                              "previous": link(page - 1) if page > 1 else None, "results": items})
+
+    def _challenge(self, repo=None):
+        """校验 registry token；不通过时发送 401 质询并返回 True。"""
+        auth = self.headers.get("Authorization", "")
+        if auth.startswith("Bearer bench:"):
+            repos = auth[len("Bearer bench:"):].split("|")
+            if repo is None or repo in repos:
+                return False
+        challenge = f'Bearer realm="http://{self.headers.get("Host")}/token",service="mock-registry"'
+        if repo is not None:
+            challenge += f',scope="repository:{repo}:pull"'
+        self._send_json(401, {"errors": [{"code": "UNAUTHORIZED"}]}, {"WWW-Authenticate": challenge})
+        return True
+
+    def _issue_token(self, parts):
+        scopes = parse_qs(parts.query).get("scope", [])
+        repos = [scope.split(":")[1] for scope in scopes if scope.count(":") == 2]
+        self._send_json(200, {"token": "bench:" + "|".join(repos), "expires_in": 300})
+
+    def _inject(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate:
+            with self.rng_lock:
+                hit = self.rng.random() < self.error_rate
+            if hit:
+                self._send_json(429, {"message": "You have exceeded a secondary rate limit."},
+                                {"Retry-After": self.retry_after})
+                return True
+        return False
+
+    def do_POST(self):
+        if self.path == "/_reset":
+            self.registry.reset()
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/v2/users/login":
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            return self._send_json(200, {"token": "bench-token"})
+        self._send_json(404, {"message": "Not Found"})
+
+    def do_DELETE(self):
+        if self._inject():
+            return
+        reg = self.registry
+        path = urlsplit(self.path).path
+        match = re.fullmatch(r"/(orgs|users)/([^/]+)/packages/container/([^/]+)/versions/(\d+)", path)
+        if match:
+            p = reg.package_index(match.group(3))
+            version_id = int(match.group(4))
+            if p is not None and p < reg.packages and version_id // 1_000_000 == p \
+                    and version_id % 1_000_000 < reg.versions:
+                return self._send(204)
+        self._send_json(404, {"message": "Package version not found."})
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head=False):
+        parts = urlsplit(self.path)
+        path = parts.path
+        if path == "/_stats":
+            body = json.dumps(self.registry.stats()).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self._inject():
+            return
+
+        reg = self.registry
+        match = re.fullmatch(r"/(orgs|users)/([^/]+)/packages", path)
+        if match:
+            return self._paginate(parts, reg.packages,
+                                  lambda a, b: [reg.package(p) for p in range(a, b)])
+
+        match = re.fullmatch(r"/(orgs|users)/([^/]+)/packages/container/([^/]+)", path)
+        if match:
+            p = reg.package_index(match.group(3))
+            if p is None or p >= reg.packages:
+                return self._send_json(404, {"message": "Package not found."})
+            return self._send_json(200, reg.package(p))
+
+        match = re.fullmatch(r"/(orgs|users)/([^/]+)/packages/container/([^/]+)/versions", path)
+        if match:
+            p = reg.package_index(match.group(3))
+            if p is None or p >= reg.packages:
+                return self._send_json(404, {"message": "Package not found."})
+            return self._paginate(parts, reg.versions, lambda a, b: reg.versions_slice(p, a, b))
+
+        if path == "/token":
+            return self._issue_token(parts)
+        if path == "/v2/":
+            if not self._challenge():
+                self._send_json(200, {})
+            return
+
+        match = re.fullmatch(r"/v2/repositories/([^/]+)/?", path)
+        if match:
+            return self._paginate_counted(parts, reg.packages,
+                                          lambda a, b: [reg.hub_repository(p) for p in range(a, b)])
+
+        match = re.fullmatch(r"/v2/repositories/([^/]+)/([^/]+)/tags/?", path)
+        if match:
+            p = reg.package_index(match.group(2))
+            if p is None or p >= reg.packages:
+                return self._send_json(404, {"message": "object not found"})
+            return self._paginate_counted(parts, reg.versions + 1, lambda a, b: reg.hub_tags_slice(p, a, b))
+
+        match = re.fullmatch(r"/v2/(.+)/manifests/([^/]+)", path)
+        if match:
+            repo, ref = match.groups()
+            if self._challenge(repo):
+                return
+            if ref.startswith("sha256:"):
+                digest, body = ref, reg.by_digest(ref)
+            else:
+                p = reg.package_index(repo.rsplit("/", 1)[-1])
+                i = reg.tag_index(ref)
+                found = p is not None and p < reg.packages and i is not None and i < reg.versions
+                digest, body = (reg.manifest_digest(p, i), reg.manifest_body(p, i)) if found else (None, None)
+            if body is None:
+                return self._send_json(404, {"errors": [{"code": "MANIFEST_UNKNOWN"}]})
+            media_type = json.loads(body).get("mediaType")
+            return self._send(200, body, {"Content-Type": media_type, "Docker-Content-Digest": digest}, head=head)
+
+        match = re.fullmatch(r"/v2/(.+)/blobs/([^/]+)", path)
+        if match:
+            if self._challenge(match.group(1)):
+                return
+            body = reg.by_digest(match.group(2))
+            if body is None:
+                return self._send_json(404, {"errors": [{"code": "BLOB_UNKNOWN"}]})
+            return self._send(200, body, {"Content-Type": "application/octet-stream"}, head=head)
+
+        self._send_json(404, {"message": "Not Found"})
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端退出时断开 keep-alive 连接是正常现象
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def make_server(port=0, packages=100, versions=50, latency_ms=0, error_rate=0.0, retry_after="0",
+                untagged_every=3, multiarch_every=4, seed=0):
+    registry = SyntheticRegistry(packages, versions, untagged_every, multiarch_every, seed)
+    handler = type("BoundHandler", (Handler,), {
+        "registry": registry,
+        "latency": latency_ms / 1000.0,
+        "error_rate": error_rate,
+        "retry_after": retry_after,
+        "rng": random.Random(seed),
+        "rng_lock": threading.Lock(),
+    })
+    server = QuietServer(("127.0.0.1", port), handler)
+    server.registry = registry
+    return server
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--packages", type=int, default=100, help="Packages per namespace")
+    parser.add_argument("--versions", type=int, default=50, help="Versions per package")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latency added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=str, default="0", help="Retry-After value sent with injected 429s")
+    parser.add_argument("--untagged-every", type=int, default=3, help="Every Nth version has no tags (0: none)")
+    parser.add_argument("--multiarch-every", type=int, default=4,
+                        help="Every Nth package publishes multi-arch OCI indexes (0: none)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for error injection")
+
+
+def server_from_args(args, port=0):
+    return make_server(port, args.packages, args.versions, args.latency_ms, args.error_rate,
+                       args.retry_after, args.untagged_every, args.multiarch_every, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic GitHub Packages API / ghcr.io registry / Docker Hub API.")
+    parser.add_argument("--port", type=int, default=8080)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    server = server_from_args(args, args.port)
+    print(f"Mock registry on http://127.0.0.1:{server.server_address[1]} "
+          f"({args.packages} packages x {args.versions} versions)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+镜像列表脚本的吞吐量压测。
+
+在本地启动 mock_registry，把各脚本的 GITHUB_API_URL / GHCR_REGISTRY_URL / DOCKERHUB_API_URL 指向它，
+逐个运行脚本并报告：墙钟时间、请求数、传输字节数、峰值 RSS。
+可以把结果保存为基线，之后与基线比较，超出阈值时以非零状态退出，用来发现性能回退。
+每个场景结束后还会用 snapshot_diff.py 把结果文件与它自己比较，变更集必须为空。
+
+用法：
+    python run_bench.py --packages 500 --versions 200 --latency-ms 10
+    python run_bench.py --save-baseline bench_baseline.json
+    python run_bench.py --baseline bench_baseline.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from mock_registry import add_server_arguments, server_from_args
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAMESPACE = "bench"
+
+# 名称 -> (脚本文件, 参数, 结果文件)
+SCENARIOS = {
+    "ghcr_list_images": ("ghcr_list_images.py", ["--namespace", NAMESPACE, "--org", "--token", "bench"],
+                         "ghcr_results.json"),
+    "list_dockerhub_images": ("list_dockerhub_images.py", ["--namespace", NAMESPACE], "dockerhub_results.json"),
+    "import_requests": ("import requests.py", ["--namespace", NAMESPACE, "--org", "--token", "bench"],
+                        "ghcr_results.json"),
+}
+COMPARED_METRICS = ("wall_seconds", "requests", "bytes", "peak_rss_kb")
+
+
+def self_diff(result_path, workdir):
+    """结果文件与自己比较应当没有任何变更；返回 snapshot_diff.py --exit-code 的退出码。"""
+    cmd = [sys.executable, os.path.join(SCRIPTS_DIR, "snapshot_diff.py"), "diff", result_path, result_path,
+           "--exit-code", "--format", "ndjson", "--output", os.devnull]
+    return subprocess.run(cmd, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+
+
+def run_scenario(name, base_url, server, extra_args, workdir):
+    script, args, result_file = SCENARIOS[name]
+    env = dict(os.environ, GITHUB_API_URL=base_url, GHCR_REGISTRY_URL=base_url, DOCKERHUB_API_URL=base_url)
+    server.registry.reset()
+    cmd = [sys.executable, os.path.join(SCRIPTS_DIR, script)] + args + extra_args
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    stderr = proc.stderr.read()
+    # wait4 返回该子进程自己的资源使用情况（ru_maxrss 在 Linux 上以 KB 为单位）
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    stats = server.registry.stats()
+    result_path = os.path.join(workdir, result_file)
+    return {
+        "scenario": name,
+        "exit_code": proc.returncode,
+        "wall_seconds": round(wall, 3),
+        "requests": stats["requests"],
+        "bytes": stats["bytes_sent"],
+        "status_counts": stats["status_counts"],
+        "peak_rss_kb": usage.ru_maxrss,
+        "self_diff_exit": self_diff(result_path, workdir) if os.path.exists(result_path) else None,
+        "stderr_tail": stderr.decode(errors="replace")[-500:] if proc.returncode else "",
+    }
+
+
+def compare(results, baseline, max_regression):
+    """返回超过阈值的回退项列表。"""
+    base_by_name = {r["scenario"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        base = base_by_name.get(result["scenario"])
+        if not base:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = base.get(metric), result.get(metric)
+            if old and new and (new - old) / old > max_regression:
+                regressions.append(f"{result['scenario']}.{metric}: {old} -> {new} (+{(new - old) / old:.0%})")
+    return regressions
+
+
+def print_report(results):
+    headers = ["Scenario", "Exit", "Wall (s)", "Requests", "Bytes", "Peak RSS (MB)"]
+    rows = [[r["scenario"], str(r["exit_code"]), f"{r['wall_seconds']:.2f}", str(r["requests"]),
+             str(r["bytes"]), f"{r['peak_rss_kb'] / 1024:.1f}"] for r in results]
+    widths = [max(len(h), *(len(row[i]) for row in rows)) for i, h in enumerate(headers)]
+    print(" | ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    print("-+-".join("-" * w for w in widths))
+    for row in rows:
+        print(" | ".join(v.ljust(w) for v, w in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the image lister scripts against a local mock registry.")
+    add_server_arguments(parser)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), default=None,
+                        help="Scenario to run (repeatable; default: all)")
+    parser.add_argument("--script-args", type=str, default="",
+                        help="Extra arguments passed to every script, e.g. \"--concurrency 16\"")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    parser.add_argument("--save-baseline", type=str, default=None, help="Save results as a baseline file")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare against a saved baseline")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed relative increase per metric before failing (default 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    server = server_from_args(args)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Mock registry: {base_url} ({args.packages} packages x {args.versions} versions, "
+          f"latency {args.latency_ms} ms, 429 rate {args.error_rate})")
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for name in args.scenario or list(SCENARIOS):
+                print(f"▶ {name} ...", flush=True)
+                results.append(run_scenario(name, base_url, server, args.script_args.split(), workdir))
+    finally:
+        server.shutdown()
+
+    print_report(results)
+    for r in results:
+        if r["exit_code"]:
+            print(f"⚠️ {r['scenario']} exited with {r['exit_code']}: {r['stderr_tail']}", file=sys.stderr)
+        if r["self_diff_exit"]:
+            print(f"❌ {r['scenario']}: 结果文件与自身比较出现了变更（snapshot_diff 退出码 {r['self_diff_exit']}）",
+                  file=sys.stderr)
+
+    report = {"config": {k: v for k, v in vars(args).items() if k not in ("json", "save_baseline", "baseline")},
+              "results": results}
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    exit_code = 1 if any(r["exit_code"] or r["self_diff_exit"] for r in results) else 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"❌ 性能回退: {line}")
+        if regressions:
+            exit_code = 1
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,178 +1,354 @@
 import requests
 import json
 import argparse
+import os
 import sys
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from urllib.parse import quote
 
-### 不好用，暂时不用
-def fetch_manifest_arch(repo_name, tag, token):
-    url = f"https://ghcr.io/v2/{repo_name}/manifests/{tag}"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.docker.distribution.manifest.v2+json, application/vnd.oci.image.manifest.v1+json, application/vnd.docker.distribution.manifest.list.v2+json"
-    }
-    try:
-        r = requests.get(url, headers=headers)
-        r.raise_for_status()
-        manifest = r.json()
-
-        # 如果是 manifest list（多架构）
-        if manifest.get("mediaType", "").endswith("manifest.list.v2+json"):
-            return [m.get("platform", {}).get("architecture", "unknown") for m in manifest.get("manifests", [])]
-
-        # 如果是单架构镜像
-        elif manifest.get("mediaType", "").endswith("manifest.v2+json"):
-            # 有些 registry 会返回 config 中包含 architecture
-            return [manifest.get("architecture", "unknown")] if "architecture" in manifest else ["unknown"]
+from http_cache import add_cache_arguments, cache_from_args
+from http_client import GITHUB_API_URL, HttpClient
+from inventory_store import is_store_spec, store_from_args
+from layer_index import LayerIndex, print_report_summary
+from manifest_store import ManifestStore
+from metrics import add_metrics_arguments, metrics_from_args
+from pagination import DEFAULT_PAGE_WORKERS, MAX_PER_PAGE, fetch_all, iter_pages
+from rate_limit import add_scheduler_arguments, scheduler_from_args
+from records import ImageRecord, add_table_arguments, print_table, records_to_dicts, stream_renderer
+from registry_auth import RegistryAuth
+from result_io import ResultWriter, TeeWriter, add_output_arguments, output_path_from_args
+from snapshot import Snapshot, load_snapshot, write_index
+from version_window import VersionWindow, add_window_arguments, window_from_args
+from workers import ordered_map
 
-    except requests.RequestException as e:
+def fetch_manifest_arch(repo_name, reference, store):
+    try:
+        return store.architectures(repo_name, reference)
+    except (requests.RequestException, ValueError) as e:
         print(f"  ⚠️ 获取架构失败: {e}")
         return ["unknown"]
 
+def resolve_architectures(rows, store, workers):
+    """按 digest 去重后并发解析架构并回填到结果行，共用同一 digest 的标签只查询一次。"""
+    repos_by_digest = {}
+    for row in rows:
+        if not row.architectures and row.digest != "N/A":
+            # image_name 形如 ghcr.io/<owner>/<package>，registry 路径要求小写
+            repos_by_digest.setdefault(row.digest, row.image_name.split("/", 1)[1].lower())
+    if not repos_by_digest:
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        digests = list(repos_by_digest)
+        resolved = dict(zip(digests, executor.map(
+            lambda d: fetch_manifest_arch(repos_by_digest[d], d, store), digests)))
+    for row in rows:
+        if row.digest in resolved and not row.architectures:
+            row.architectures = resolved[row.digest]
+
 
-def fetch_packages(namespace, is_org, headers):
-    url = f"https://api.github.com/{'orgs' if is_org else 'users'}/{namespace}/packages?package_type=container"
-    r = requests.get(url, headers=headers)
-    r.raise_for_status()
-    return r.json()
+def fetch_packages(namespace, is_org, client, page_workers=DEFAULT_PAGE_WORKERS):
+    url = f"{GITHUB_API_URL}/{'orgs' if is_org else 'users'}/{namespace}/packages?package_type=container"
+    return fetch_all(client, url, workers=page_workers)
 
-def fetch_versions(namespace, pkg_name, is_org, headers):
+def package_url(namespace, pkg_name, is_org):
     encoded_name = quote(pkg_name, safe='')
-    url = f"https://api.github.com/{'orgs' if is_org else 'users'}/{namespace}/packages/container/{encoded_name}/versions"
-    r = requests.get(url, headers=headers)
-    r.raise_for_status()
-    return r.json()
+    return f"{GITHUB_API_URL}/{'orgs' if is_org else 'users'}/{namespace}/packages/container/{encoded_name}"
 
-def main():
-    parser = argparse.ArgumentParser(description="List GHCR container packages for a namespace.")
-    parser.add_argument("--namespace", type=str, required=True, help="GitHub username or organization name")
-    parser.add_argument("--org", action="store_true", help="Specify if the namespace is an organization")
-    parser.add_argument("--token", type=str, required=True, help="GitHub token with read:packages scope")
-    args = parser.parse_args()
+def versions_url(namespace, pkg_name, is_org):
+    return f"{package_url(namespace, pkg_name, is_org)}/versions"
 
-    headers = {
-        "Authorization": f"Bearer {args.token}",
-        "Accept": "application/vnd.github+json"
-    }
-    if not args.namespace:
-        print("错误: --namespace 不能为空", file=sys.stderr)
-        sys.exit(1)
+def fetch_version_pages(namespace, pkg_name, is_org, client, page_workers=DEFAULT_PAGE_WORKERS, window=None):
+    """按页产出版本列表，调用方处理完一页即可丢弃；设置了截止条件时逐页按需获取。"""
+    window = window or VersionWindow()
+    return iter_pages(client, versions_url(namespace, pkg_name, is_org), per_page=window.page_size(MAX_PER_PAGE),
+                      workers=page_workers, sequential=window.stops_early)
+
+def scan_package(namespace, is_org, pkg, client, snapshot, store=None, page_workers=DEFAULT_PAGE_WORKERS,
+                 window=None, layer_index=None):
+    """
+    在工作线程中处理一个包：未更新则复用快照，否则逐页获取版本并展开成行，
+    需要时解析架构、把各 manifest 的层加入层索引。异常带回主线程按原顺序处理。
+    设置了版本过滤时，窗口内没有版本的包返回空的 rows。
+    返回 (image_ref, rows, error, reused)。
+    """
+    window = window or VersionWindow()
+    image_ref = f"ghcr.io/{namespace}/{pkg.get('name')}"
+    if not window.package_changed_since(pkg.get("updated_at")):
+        return image_ref, [], None, False
+    rows = snapshot.reusable_rows(image_ref, pkg.get("updated_at"))
+    reused = rows is not None
+    if not reused and pkg.get("version_count") == 0:
+        # 包列表已经给出版本数为 0，不必再请求 versions 接口
+        rows = [] if window.active else build_package_rows(image_ref, [])
+    elif not reused:
+        try:
+            with client.metrics.stage("fetch_versions"):
+                pages = fetch_version_pages(namespace, pkg.get("name"), is_org, client, page_workers, window)
+                versions = window.select(pages) if window.active else chain.from_iterable(pages)
+                rows = build_package_rows(image_ref, versions)
+        except requests.RequestException as e:
+            return image_ref, None, e, False
+        if window.active and not rows[0].has_tags:
+            rows = []
+    if reused and store is None:
+        # 快照可能来自带 --arch 的运行，本次没有解析架构，输出要与完整扫描一致
+        for row in rows:
+            row.architectures = []
+    if store is not None:
+        with client.metrics.stage("resolve_architectures"):
+            resolve_architectures(rows, store, page_workers)
+    if layer_index is not None and rows:
+        with client.metrics.stage("index_layers"):
+            layer_index.add_rows(rows, page_workers)
+    return image_ref, rows, None, reused
+
+def build_package_rows(image_ref, versions):
+    """把一个包的版本（可以是逐页产出的迭代器）展开成结果行（每个标签一行）。"""
+    rows = []
+    seen_tags = set()  # 用于记录已处理过的标签
+    for version in versions:
+        tag_names = version.get("metadata", {}).get("container", {}).get("tags", [])
+        if not tag_names:
+            tag_names = ["latest"]
+        pushed_at = version.get("updated_at") or version.get("created_at") or "N/A"
+        digest = version.get("name") or "N/A"
+        size_bytes = version.get("metadata", {}).get("container", {}).get("size", 0)
+        architectures = []
+        for tag in tag_names:
+            if tag in seen_tags:
+                continue  # 已处理，跳过
+
+            seen_tags.add(tag)
+            rows.append(ImageRecord(image_ref, tag, digest, pushed_at, size_bytes, architectures))
+    if not rows:
+        # 对应无版本的条目，保持输出一致
+        rows.append(ImageRecord.no_tags(image_ref))
+    return rows
 
-    print(f"查询 GHCR 镜像（命名空间: {args.namespace}, 类型: {'组织' if args.org else '用户'}）")
+def load_namespaces_file(path, default_is_org):
+    """
+    读取命名空间列表文件：每行 "<名称> [org|user]"，# 开头为注释。
+    未指定类型的行使用 --org 的取值。
+    """
+    namespaces = []
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            if len(parts) > 2 or (len(parts) == 2 and parts[1] not in ("org", "user")):
+                raise ValueError(f"{path}:{line_no}: 格式应为 '<namespace> [org|user]'")
+            is_org = parts[1] == "org" if len(parts) == 2 else default_is_org
+            namespaces.append((parts[0], is_org))
+    return namespaces
+
+def namespace_output_path(path, namespace):
+    """per-namespace 模式下每个命名空间的结果文件：ghcr_results.json -> ghcr_results.<namespace>.json"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{namespace}{ext}"
+
+def scan_namespace(namespace, is_org, client, args, snapshot, store, writer, results, package_updated_at,
+                   window=None, layer_index=None):
+    """扫描一个命名空间并把行写入 writer；返回是否成功获取包列表。"""
+    print(f"查询 GHCR 镜像（命名空间: {namespace}, 类型: {'组织' if is_org else '用户'}）")
     print("-" * 50)
 
     try:
-        packages = fetch_packages(args.namespace, args.org, headers)
-    except requests.HTTPError as e:
+        with client.metrics.stage("list_packages"):
+            packages = fetch_packages(namespace, is_org, client, args.page_concurrency)
+    except requests.RequestException as e:
         print(f"❌ 获取包列表失败: {e}")
-        sys.exit(1)
+        return False
 
     if not packages:
         print("⚠️ 未找到任何容器镜像。")
-        print("::set-output name=results_json_path::ghcr_results.json")
-        print("::set-output name=results_json_string::[]")
-        with open("ghcr_results.json", "w") as f:
-            json.dump([], f, indent=2)
-        return
+        return True
 
-    results = []
-    table_data = []
-    for pkg in packages:
-        name = pkg.get("name")
-        print(f"📦 镜像: ghcr.io/{args.namespace}/{name}")
+    registry = store or (layer_index.store if layer_index is not None else None)
+    if registry is not None:
+        # 一次交换为多个包换取 registry token，获取 manifest 时不再逐个仓库质询
         try:
-            versions = fetch_versions(args.namespace, name, args.org, headers)
-        except requests.HTTPError as e:
-            print(f"  ❌ 获取版本失败: {e}")
-            continue
+            with client.metrics.stage("registry_auth"):
+                registry.prefetch_auth([f"{namespace}/{pkg.get('name')}".lower() for pkg in packages])
+        except requests.RequestException as e:
+            print(f"⚠️ 预先获取 registry token 失败，改为按需获取: {e}")
 
-        if not versions:
-            print("  ⚠️ 没有标签版本。")
-            # 对应无版本的条目，保持输出一致
-            table_data.append({
-                "Image:Tag": f"ghcr.io/{args.namespace}/{name}:(No Tags)",
-                "ID (digest)": "N/A",
-                "Pushed At": "N/A",
-                "Size": "N/A",
-                "Architectures": "N/A"
-            })
-            results.append({
-                "image_name": f"ghcr.io/{args.namespace}/{name}",
-                "tag": "(No Tags)",
-                "digest": "N/A",
-                "pushed_at": "N/A",
-                "size_bytes": 0,
-                "size_mb": 0.0,
-                "architectures": []
-            })
+    # 并发处理各个包；ordered_map 按提交顺序返回，保证输出顺序不变，且只提前处理有限个包
+    scanned = ordered_map(
+        lambda pkg: scan_package(namespace, is_org, pkg, client, snapshot, store, args.page_concurrency, window,
+                                 layer_index),
+        packages, args.concurrency)
+    updated_at_by_image = {f"ghcr.io/{namespace}/{pkg.get('name')}": pkg.get("updated_at") for pkg in packages}
+    renderer = stream_renderer(args.max_column_width)
+    reused_count = 0
+    for image_ref, rows, error, reused in scanned:
+        print(f"📦 镜像: {image_ref}")
+        if error is not None:
+            print(f"  ❌ 获取版本失败: {error}")
             continue
-        seen_tags = set()  # 用于记录已处理过的 image_ref:tag
-        for version in versions:
-            tag_names = version.get("metadata", {}).get("container", {}).get("tags", [])
-            if not tag_names:
-                tag_names = ["latest"]
-            pushed_at = version.get("updated_at") or version.get("created_at") or "N/A"
-            digest = version.get("name") or "N/A"
-            size_bytes = version.get("metadata", {}).get("container", {}).get("size", 0)
-            size_mb = round(size_bytes / (1024 * 1024), 2)
-
-            formatted_pushed_at = "N/A"
-            if pushed_at != "N/A":
-                try:
-                    dt_object = datetime.strptime(pushed_at, "%Y-%m-%dT%H:%M:%SZ")
-                    formatted_pushed_at = dt_object.strftime("%Y-%m-%d %H:%M:%S UTC")
-                except Exception:
-                    formatted_pushed_at = pushed_at
-            arch_str = "N/A"
-            architectures = []
-            #for tag in tag_names:
-            #    architectures = fetch_manifest_arch(f"{args.namespace}/{name}", tag, args.token)
-            #architectures = fetch_manifest_arch(f"{args.namespace}/{name}", tag_names, args.token)
-            for tag in tag_names:
-                image_ref = f"ghcr.io/{args.namespace}/{name}"
-                tag_key = f"{image_ref}:{tag}"
-                if tag_key in seen_tags:
-                    continue  # 已处理，跳过
-
-                seen_tags.add(tag_key)
-                table_data.append({
-                    "Image:Tag": f"{image_ref}:{tag}",
-                    "ID (digest)": digest,
-                    "Pushed At": formatted_pushed_at,
-                    "Size": f"{size_mb:.2f} MB" if size_bytes else "0.00 MB",
-                    "Architectures": arch_str
-                })
-                results.append({
-                    "image_name": image_ref,
-                    "tag": tag,
-                    "digest": digest,
-                    "pushed_at": pushed_at,
-                    "size_bytes": size_bytes,
-                    "size_mb": size_mb,
-                    "architectures": architectures
-                })
-
-    # 打印表格
-    if table_data:
-        headers = ["Image:Tag", "ID (digest)", "Pushed At", "Size", "Architectures"]
-        column_widths = {h: len(h) for h in headers}
-        for row in table_data:
-            for h in headers:
-                column_widths[h] = max(column_widths[h], len(str(row.get(h, ""))))
-        print(" | ".join(h.ljust(column_widths[h]) for h in headers))
-        print("-+-".join("-" * column_widths[h] for h in headers))
-        for row in table_data:
-            print(" | ".join(str(row.get(h, "")).ljust(column_widths[h]) for h in headers))
+        if reused:
+            print("  ♻️ 自上次扫描以来未更新，复用快照。")
+            reused_count += 1
+        elif not rows:
+            print("  ⏭️ 过滤条件内没有版本。")
+        elif not rows[0].has_tags:
+            print("  ⚠️ 没有标签版本。")
+        if updated_at_by_image.get(image_ref):
+            package_updated_at[image_ref] = updated_at_by_image[image_ref]
+
+        with client.metrics.stage("write_output"):
+            writer.write_many(rows)
+        client.metrics.add_counters(packages=1, reused_packages=int(reused), rows=len(rows))
+        if results is None:
+            # 流式模式不保留行，按固定列宽逐行打印
+            renderer.print_rows(rows)
+        else:
+            results.extend(rows)
+
+    if args.previous:
+        print(f"♻️ 增量扫描: 复用 {reused_count} 个包，重新获取 {len(packages) - reused_count} 个包。")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="List GHCR container packages for one or more namespaces.")
+    parser.add_argument("--namespace", type=str, action="append", default=[],
+                        help="GitHub username or organization name (repeatable)")
+    parser.add_argument("--namespaces-file", type=str, default=None,
+                        help="File with one '<namespace> [org|user]' entry per line")
+    parser.add_argument("--org", action="store_true",
+                        help="Specify if the namespace is an organization (default for entries without a type)")
+    parser.add_argument("--token", type=str, required=True, help="GitHub token with read:packages scope")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of packages to fetch versions for in parallel")
+    parser.add_argument("--page-concurrency", type=int, default=DEFAULT_PAGE_WORKERS,
+                        help="Number of pages to fetch in parallel per paginated listing")
+    add_cache_arguments(parser)
+    add_scheduler_arguments(parser)
+    add_window_arguments(parser)
+    parser.add_argument("--previous", type=str, default=None,
+                        help="Previous ghcr_results.json (or sqlite:inventory.db); "
+                             "packages whose updated_at has not changed reuse its rows")
+    parser.add_argument("--arch", action="store_true",
+                        help="Resolve architectures from the registry (manifest list / OCI index / config blob)")
+    parser.add_argument("--manifest-cache-dir", type=str, default=None,
+                        help="Directory for the digest-addressed manifest and config cache")
+    parser.add_argument("--layer-report", type=str, default=None,
+                        help="Fetch each image's manifests and write storage per package and namespace with "
+                             "layers deduplicated by digest, plus layers shared across packages, to this JSON file")
+    add_output_arguments(parser, "ghcr_results")
+    add_table_arguments(parser)
+    add_metrics_arguments(parser)
+    parser.add_argument("--output-mode", choices=("combined", "per-namespace"), default="combined",
+                        help="Write all namespaces to one result file or one file per namespace")
+    args = parser.parse_args()
+
+    namespaces = [(ns, args.org) for ns in args.namespace if ns]
+    if args.namespaces_file:
+        try:
+            namespaces.extend(load_namespaces_file(args.namespaces_file, args.org))
+        except (OSError, ValueError) as e:
+            print(f"错误: 无法读取命名空间列表: {e}", file=sys.stderr)
+            sys.exit(1)
+    # 同一命名空间只扫描一次，以第一次出现的类型为准
+    seen_namespaces = set()
+    namespaces = [(ns, is_org) for ns, is_org in namespaces
+                  if ns.lower() not in seen_namespaces and not seen_namespaces.add(ns.lower())]
+    if not namespaces:
+        print("错误: --namespace 不能为空", file=sys.stderr)
+        sys.exit(1)
+    if args.concurrency < 1 or args.page_concurrency < 1:
+        print("错误: --concurrency 和 --page-concurrency 必须大于 0", file=sys.stderr)
+        sys.exit(1)
+    if args.timeout <= 0:
+        print("错误: --timeout 必须大于 0", file=sys.stderr)
+        sys.exit(1)
+    try:
+        window = window_from_args(args)
+    except ValueError as e:
+        print(f"错误: 无效的版本过滤条件: {e}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        # 只扫描了部分版本时不能删除清单库中没出现的标签
+        inventory = store_from_args(args, prune=not window.active)
+    except ValueError as e:
+        print(f"错误: 无法打开清单库: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    # 所有命名空间共用一个连接池、缓存和限速调度器，大小与工作线程数（包 × 分页）一致
+    pool_size = args.concurrency * args.page_concurrency
+    client = HttpClient(pool_size=pool_size, cache=cache_from_args(args),
+                        scheduler=scheduler_from_args(args, pool_size), metrics=metrics_from_args(args),
+                        timeout=args.timeout)
+    client.set_default_headers(GITHUB_API_URL, {
+        "Authorization": f"Bearer {args.token}",
+        "Accept": "application/vnd.github+json"
+    })
+    store = None
+    layer_index = None
+    if args.arch or args.layer_report:
+        # ghcr.io 只校验 PAT，用户名可以任意；架构解析和层索引共用同一份 manifest 缓存
+        manifests = ManifestStore(client, cache_dir=args.manifest_cache_dir,
+                                  auth=RegistryAuth(client, username="token", password=args.token))
+        store = manifests if args.arch else None
+        layer_index = LayerIndex(manifests) if args.layer_report else None
+
+    output_path = output_path_from_args(args, "ghcr_results")
+    per_namespace = args.output_mode == "per-namespace"
+    # combined 模式下只有一个输出；per-namespace 模式下每个命名空间一个输出和一个快照（清单库共用一个）
+    if per_namespace:
+        targets = [([(ns, is_org)], namespace_output_path(output_path, ns),
+                    namespace_output_path(args.previous, ns)
+                    if args.previous and not is_store_spec(args.previous) else args.previous)
+                   for ns, is_org in namespaces]
     else:
-        print("未找到任何标签版本。")
+        targets = [(namespaces, output_path, args.previous)]
 
-    output_path = "ghcr_results.json"
-    with open(output_path, "w") as f:
-        json.dump(results, f, indent=2)
+    failed = []
+    written = []
+    results = None
+    for target_namespaces, path, previous in targets:
+        snapshot = load_snapshot(previous, window.describe()) if previous else Snapshot()
+        package_updated_at = {}
+        results = None if args.stream else []
+        with ResultWriter(path, args.format) as writer:
+            sink = TeeWriter(writer, inventory)
+            for namespace, is_org in target_namespaces:
+                if not scan_namespace(namespace, is_org, client, args, snapshot, store,
+                                      sink, results, package_updated_at, window, layer_index):
+                    failed.append(namespace)
+        write_index(path, package_updated_at, window.describe())
+        if inventory is not None:
+            inventory.write_index(package_updated_at, window.describe())
+        written.append((path, writer.count))
+        if results is not None:
+            with client.metrics.stage("render_table"):
+                print_table(results, args.max_column_width)
 
-    print(f"::set-output name=results_json_path::{output_path}")
-    print(f"::set-output name=results_json_string::{json.dumps(results)}")
+    if per_namespace:
+        print(f"::set-output name=results_json_paths::{','.join(path for path, _ in written)}")
+    else:
+        print(f"::set-output name=results_json_path::{output_path}")
+        if results is not None:
+            print(f"::set-output name=results_json_string::{json.dumps(records_to_dicts(results))}")
+    if args.stream or per_namespace:
+        for path, count in written:
+            print(f"共写出 {count} 条记录到 {path}")
+    if inventory is not None:
+        inventory.close()
+        print(f"🗄️ 共写入 {inventory.count} 条记录到清单库 {args.store}")
+    if layer_index is not None:
+        print_report_summary(layer_index.write_report(args.layer_report), args.layer_report)
+    client.print_stats()
+    registry = store or (layer_index.store if layer_index is not None else None)
+    if registry is not None and registry.auth.challenges:
+        print(f"🔑 registry token: 质询 {registry.auth.challenges} 次，交换 {registry.auth.exchanges} 次")
+    if registry is not None:
+        client.metrics.add_counters(token_exchanges=registry.auth.exchanges)
+    client.metrics.finish(client)
+    if failed:
+        print(f"❌ 以下命名空间获取包列表失败: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
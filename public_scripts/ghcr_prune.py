@@ -0,0 +1,266 @@
+"""
+GHCR 版本保留策略与批量删除。
+
+按策略计算每个包要删除的版本：
+- --untagged：没有标签的版本；
+- --older-than N：创建时间早于 N 天的版本；
+- --keep-last K：每个包最新的 K 个带标签版本无论如何都保留；
+- 保留下来的带标签版本如果是 manifest list / OCI index，它引用的子 manifest 也一并保留
+  （通常是无标签版本，也可能带有 app:1.0-amd64 这样的标签），否则会弄坏多架构镜像。
+默认只输出删除计划（dry-run）；加 --execute 才并发发送 DELETE，请求与列表脚本一样经过限速调度器。
+
+用法：
+    python ghcr_prune.py --namespace my-org --org --token $TOKEN --untagged --older-than 30 --keep-last 10
+    python ghcr_prune.py ... --execute
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from ghcr_list_images import fetch_packages, fetch_version_pages, package_url, versions_url
+from http_client import GITHUB_API_URL, HttpClient
+from manifest_store import ManifestStore
+from metrics import add_metrics_arguments, metrics_from_args
+from pagination import DEFAULT_PAGE_WORKERS
+from rate_limit import add_scheduler_arguments, scheduler_from_args
+from registry_auth import RegistryAuth
+from result_io import FORMATS, ResultWriter
+from version_window import ghcr_version_date, ghcr_version_tagged, parse_timestamp
+from workers import ordered_map
+
+DEFAULT_DELETE_CONCURRENCY = 16
+
+
+class RetentionPolicy:
+    def __init__(self, untagged=False, older_than_days=None, keep_last=None, now=None):
+        self.untagged = untagged
+        self.older_than_days = older_than_days
+        self.keep_last = keep_last
+        self.cutoff = None
+        if older_than_days is not None:
+            self.cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=older_than_days)
+
+    @property
+    def active(self):
+        return self.untagged or self.cutoff is not None
+
+    def reason(self, version):
+        """返回版本命中的删除条件；都不命中时返回 None。"""
+        if self.untagged and not ghcr_version_tagged(version):
+            return "untagged"
+        if self.cutoff is not None:
+            value = ghcr_version_date(version)
+            try:
+                if value and parse_timestamp(value) < self.cutoff:
+                    return f"older than {self.older_than_days}d"
+            except ValueError:
+                pass
+        return None
+
+    def split(self, versions):
+        """
+        把一个包的版本分成 (candidates, kept)，candidates 为 [(version, reason), ...]。
+        不依赖接口的返回顺序，先按创建时间倒序排好再数 --keep-last。
+        """
+        versions = sorted(versions, key=lambda v: ghcr_version_date(v) or "", reverse=True)
+        candidates, kept = [], []
+        tagged_kept = 0
+        for version in versions:
+            if self.keep_last is not None and ghcr_version_tagged(version) and tagged_kept < self.keep_last:
+                tagged_kept += 1
+                kept.append(version)
+                continue
+            reason = self.reason(version)
+            if reason is None:
+                kept.append(version)
+            else:
+                candidates.append((version, reason))
+        if candidates and not kept:
+            # GitHub 不允许删除包的最后一个版本（只能删除整个包），保留最新的一个
+            kept.append(candidates.pop(0)[0])
+        return candidates, kept
+
+
+def protected_digests(repo, kept, store):
+    """保留的带标签版本引用的子 manifest digest；索引按 digest 缓存，同一个索引只下载一次。"""
+    digests = set()
+    for version in kept:
+        if ghcr_version_tagged(version) and version.get("name"):
+            digests.update(store.children(repo, version["name"]))
+    return digests
+
+
+def plan_record(image_ref, package, version, reason):
+    return {
+        "image_name": image_ref,
+        "package": package,
+        "version_id": version.get("id"),
+        "digest": version.get("name") or "N/A",
+        "tags": version.get("metadata", {}).get("container", {}).get("tags", []),
+        "created_at": ghcr_version_date(version) or "N/A",
+        "reason": reason,
+    }
+
+
+def plan_package(namespace, is_org, pkg, client, store, policy, page_workers=DEFAULT_PAGE_WORKERS):
+    """
+    在工作线程中为一个包计算删除计划；返回 (image_ref, plan, kept_count, error)。
+    保留版本的 manifest 取不到时整个包都不删，宁可少删也不能弄坏还在用的镜像。
+    """
+    image_ref = f"ghcr.io/{namespace}/{pkg.get('name')}"
+    try:
+        versions = [v for page in fetch_version_pages(namespace, pkg.get("name"), is_org, client, page_workers)
+                    for v in page]
+        candidates, kept = policy.split(versions)
+        kept_count = len(kept)
+        if candidates:
+            # 子 manifest 可能是无标签版本，也可能带着按架构命名的标签，所有候选都要对照索引检查
+            protected = protected_digests(f"{namespace}/{pkg.get('name')}".lower(), kept, store)
+            kept_count += sum(1 for version, _ in candidates if version.get("name") in protected)
+            candidates = [(version, reason) for version, reason in candidates
+                          if version.get("name") not in protected]
+    except (requests.RequestException, ValueError) as e:
+        return image_ref, None, 0, e
+    plan = [plan_record(image_ref, pkg.get("name"), version, reason) for version, reason in candidates]
+    return image_ref, plan, kept_count, None
+
+
+def delete_version(client, namespace, is_org, record):
+    """
+    删除一个版本，返回 (record, error)。版本 ID 来自同一个包的版本列表，
+    所以 404 时再确认包本身还在：包在就说明版本已经被删掉了，算成功；包也不存在则算失败。
+    """
+    url = f"{versions_url(namespace, record['package'], is_org)}/{record['version_id']}"
+    try:
+        r = client.request("DELETE", url)
+        if r.status_code == 404:
+            client.get(package_url(namespace, record["package"], is_org)).raise_for_status()
+        else:
+            r.raise_for_status()
+    except requests.RequestException as e:
+        return record, e
+    return record, None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Plan and (with --execute) delete GHCR package versions according to a retention policy.")
+    parser.add_argument("--namespace", type=str, action="append", default=[],
+                        help="GitHub username or organization name (repeatable)")
+    parser.add_argument("--org", action="store_true", help="Specify if the namespaces are organizations")
+    parser.add_argument("--token", type=str, required=True,
+                        help="GitHub token with read:packages (and delete:packages for --execute) scope")
+    parser.add_argument("--untagged", action="store_true", help="Delete versions without tags")
+    parser.add_argument("--older-than", type=int, default=None, metavar="DAYS",
+                        help="Delete versions created more than DAYS days ago")
+    parser.add_argument("--keep-last", type=int, default=None, metavar="K",
+                        help="Always keep the K newest tagged versions of each package")
+    parser.add_argument("--execute", action="store_true",
+                        help="Actually delete the planned versions (default: dry-run, only write the plan)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of packages to plan in parallel")
+    parser.add_argument("--page-concurrency", type=int, default=DEFAULT_PAGE_WORKERS,
+                        help="Number of pages to fetch in parallel per paginated listing")
+    parser.add_argument("--delete-concurrency", type=int, default=DEFAULT_DELETE_CONCURRENCY,
+                        help="Number of DELETE requests in flight at once")
+    parser.add_argument("--manifest-cache-dir", type=str, default=None,
+                        help="Directory for the digest-addressed manifest cache")
+    add_scheduler_arguments(parser)
+    parser.add_argument("--format", choices=FORMATS, default="json", help="Plan file format")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Plan file path (default: ghcr_prune_plan.json / ghcr_prune_plan.ndjson)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    namespaces = list(dict.fromkeys(ns for ns in args.namespace if ns))
+    if not namespaces:
+        print("错误: --namespace 不能为空", file=sys.stderr)
+        sys.exit(1)
+    if min(args.concurrency, args.page_concurrency, args.delete_concurrency) < 1:
+        print("错误: --concurrency、--page-concurrency 和 --delete-concurrency 必须大于 0", file=sys.stderr)
+        sys.exit(1)
+    if args.timeout <= 0:
+        print("错误: --timeout 必须大于 0", file=sys.stderr)
+        sys.exit(1)
+    if (args.older_than is not None and args.older_than < 0) or (args.keep_last is not None and args.keep_last < 0):
+        print("错误: --older-than 和 --keep-last 不能为负数", file=sys.stderr)
+        sys.exit(1)
+    policy = RetentionPolicy(args.untagged, args.older_than, args.keep_last)
+    if not policy.active:
+        print("错误: 至少需要指定 --untagged 或 --older-than 之一", file=sys.stderr)
+        sys.exit(1)
+
+    pool_size = max(args.concurrency * args.page_concurrency, args.delete_concurrency)
+    client = HttpClient(pool_size=pool_size, scheduler=scheduler_from_args(args, pool_size),
+                        metrics=metrics_from_args(args), timeout=args.timeout)
+    client.set_default_headers(GITHUB_API_URL, {
+        "Authorization": f"Bearer {args.token}",
+        "Accept": "application/vnd.github+json"
+    })
+    store = ManifestStore(client, cache_dir=args.manifest_cache_dir,
+                          auth=RegistryAuth(client, username="token", password=args.token))
+
+    output_path = args.output or f"ghcr_prune_plan.{args.format}"
+    planned = []  # [(namespace, record), ...]
+    failed = []
+    with ResultWriter(output_path, args.format) as writer:
+        for namespace in namespaces:
+            print(f"计算删除计划（命名空间: {namespace}, 类型: {'组织' if args.org else '用户'}）")
+            print("-" * 50)
+            try:
+                with client.metrics.stage("list_packages"):
+                    packages = fetch_packages(namespace, args.org, client, args.page_concurrency)
+            except requests.RequestException as e:
+                print(f"❌ 获取包列表失败: {e}")
+                failed.append(namespace)
+                continue
+            if not packages:
+                print("⚠️ 未找到任何容器镜像。")
+                continue
+            try:
+                with client.metrics.stage("registry_auth"):
+                    store.prefetch_auth([f"{namespace}/{pkg.get('name')}".lower() for pkg in packages])
+            except requests.RequestException as e:
+                print(f"⚠️ 预先获取 registry token 失败，改为按需获取: {e}")
+
+            scanned = ordered_map(
+                lambda pkg: plan_package(namespace, args.org, pkg, client, store, policy, args.page_concurrency),
+                packages, args.concurrency)
+            for image_ref, plan, kept_count, error in scanned:
+                print(f"📦 镜像: {image_ref}")
+                if error is not None:
+                    print(f"  ❌ 计算删除计划失败，跳过该包: {error}")
+                    failed.append(image_ref)
+                    continue
+                print(f"  🗑️ 删除 {len(plan)} 个版本，保留 {kept_count} 个。")
+                writer.write_many(plan)
+                planned.extend((namespace, record) for record in plan)
+    print(f"删除计划共 {len(planned)} 个版本，已写入 {output_path}")
+
+    deleted = 0
+    if args.execute and planned:
+        print(f"开始删除（并发 {args.delete_concurrency}）……")
+        with client.metrics.stage("delete"):
+            results = ordered_map(lambda item: delete_version(client, item[0], args.org, item[1]),
+                                  planned, args.delete_concurrency)
+            for record, error in results:
+                if error is None:
+                    deleted += 1
+                else:
+                    print(f"  ❌ 删除 {record['image_name']}@{record['digest']}（版本 {record['version_id']}）失败: {error}")
+                    failed.append(f"{record['image_name']}#{record['version_id']}")
+        print(f"🗑️ 已删除 {deleted}/{len(planned)} 个版本。")
+    elif planned:
+        print("dry-run：没有删除任何版本，确认计划后加 --execute 执行。")
+
+    print(f"::set-output name=prune_plan_path::{output_path}")
+    client.print_stats()
+    client.metrics.add_counters(planned=len(planned), deleted=deleted)
+    client.metrics.finish(client)
+    if failed:
+        print(f"❌ 以下命名空间、包或版本处理失败: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
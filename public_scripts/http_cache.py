@@ -0,0 +1,144 @@
+"""
+持久化的 HTTP 条件请求缓存（ETag / Last-Modified）。
+
+每个 URL 保存一份响应体和校验头；再次请求时带上 If-None-Match / If-Modified-Since，
+服务器返回 304 时直接用磁盘上的内容。GitHub 不把 304 计入速率限制。
+缓存目录按总大小做 LRU 淘汰（以文件 mtime 作为最近使用时间）。
+"""
+import hashlib
+import json
+import os
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_MAX_MB = 256
+
+# 只保存后续处理需要的响应头
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link", "Docker-Content-Digest")
+
+
+class HttpCache:
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(os.path.getsize(p) for p in self._entry_paths())
+
+    def _entry_paths(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".entry"):
+                    yield os.path.join(root, name)
+
+    @staticmethod
+    def key(url, headers):
+        """URL + Accept + token 指纹决定缓存键，不同凭据看到的内容互不混用。"""
+        headers = headers or {}
+        auth = hashlib.sha256(headers.get("Authorization", "").encode()).hexdigest()[:16]
+        raw = f"{url}\n{headers.get('Accept', '')}\n{auth}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.entry")
+
+    def lookup(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                meta_line, _, body = f.read().partition(b"\n")
+            entry = json.loads(meta_line)
+        except (OSError, ValueError):
+            return None
+        entry["body"] = body
+        try:
+            os.utime(path)  # 标记为最近使用
+        except OSError:
+            pass
+        return entry
+
+    @staticmethod
+    def validators(entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, key, response):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code != 200 or not (etag or last_modified):
+            return
+        meta = {
+            "url": response.url,
+            "status": response.status_code,
+            "etag": etag,
+            "last_modified": last_modified,
+            "headers": {h: response.headers[h] for h in KEPT_HEADERS if h in response.headers},
+        }
+        data = json.dumps(meta).encode() + b"\n" + response.content
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._total_bytes += len(data) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """按最近使用时间从旧到新删除，直到总大小回到上限的 90% 以内。"""
+        entries = []
+        for path in self._entry_paths():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        target = self.max_bytes * 0.9
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def to_response(self, entry, response):
+        """用缓存内容构造一个 200 响应，替换服务器返回的 304。"""
+        cached = requests.Response()
+        cached.status_code = entry["status"]
+        cached.reason = "OK"
+        cached._content = entry["body"]
+        cached.headers = CaseInsensitiveDict(entry["headers"])
+        cached.url = response.url
+        cached.request = response.request
+        cached.encoding = requests.utils.get_encoding_from_headers(cached.headers)
+        cached.from_cache = True
+        return cached
+
+
+def add_cache_arguments(parser):
+    parser.add_argument("--cache-dir", type=str, default=None,
+                        help="Directory for the persistent HTTP (ETag) cache; disabled when omitted")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_MB,
+                        help="Maximum size of the HTTP cache directory in MB")
+
+
+def cache_from_args(args):
+    if not args.cache_dir:
+        return None
+    return HttpCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
@@ -0,0 +1,141 @@
+"""
+三个镜像列表脚本共用的 HTTP 客户端。
+
+所有对 api.github.com / ghcr.io / hub.docker.com 的请求都经过同一个 requests.Session，
+按主机复用 keep-alive 连接池，默认请求头只设置一次，并统计新建/复用的连接数。
+可选挂载 http_cache.HttpCache，对 GET 请求发送条件请求并用磁盘内容应答 304；
+可选挂载 rate_limit.RequestScheduler，统一限速、退避重试。
+可选挂载 metrics.Metrics，记录每次请求的耗时、字节数和状态码；默认的 NULL_METRICS 不做任何事。
+"""
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import NULL_METRICS
+
+# 允许通过环境变量指向 GitHub Enterprise 或本地测试服务
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+GHCR_REGISTRY_URL = os.environ.get("GHCR_REGISTRY_URL", "https://ghcr.io").rstrip("/")
+DOCKERHUB_API_URL = os.environ.get("DOCKERHUB_API_URL", "https://hub.docker.com").rstrip("/")
+
+DEFAULT_POOL_SIZE = 10
+# 读取超时是两次收到数据之间的最长间隔；卡住的连接超时后抛出 requests.Timeout，由调度器重试
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+
+
+class CountingAdapter(HTTPAdapter):
+    """可以从底层 urllib3 连接池读取连接统计的适配器。"""
+
+    def connection_stats(self):
+        opened = 0
+        requests_made = 0
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            requests_made += pool.num_requests
+        return {
+            "connections_opened": opened,
+            "connections_reused": max(requests_made - opened, 0),
+            "requests": requests_made,
+        }
+
+
+class HttpClient:
+    """带连接池的共享会话，可以被多个工作线程同时使用。"""
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, cache=None, scheduler=None, metrics=NULL_METRICS,
+                 timeout=DEFAULT_READ_TIMEOUT):
+        self.session = requests.Session()
+        self.timeout = (min(DEFAULT_CONNECT_TIMEOUT, timeout), timeout)
+        self.cache = cache
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self._cache_lock = threading.Lock()
+        self.adapter = CountingAdapter(pool_connections=DEFAULT_POOL_SIZE, pool_maxsize=max(pool_size, 1))
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self._host_headers = {}
+
+    def set_default_headers(self, base_url, headers):
+        """为某个主机设置默认请求头，避免把 GitHub token 发给其他主机。"""
+        self._host_headers[self._host_key(base_url)] = dict(headers)
+
+    @staticmethod
+    def _host_key(url):
+        parts = urlsplit(url)
+        return parts.scheme, parts.netloc
+
+    def _send_once(self, method, url, headers, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        if not self.metrics.enabled:
+            return self.session.request(method, url, headers=headers, **kwargs)
+        start = time.perf_counter()
+        response = self.session.request(method, url, headers=headers, **kwargs)
+        # 读取正文计入耗时和字节数（调用方本来也会读取）
+        nbytes = len(response.content)
+        self.metrics.observe_request(method, url, response.status_code, time.perf_counter() - start, nbytes)
+        return response
+
+    def _send(self, method, url, headers, **kwargs):
+        if self.scheduler is None:
+            return self._send_once(method, url, headers, **kwargs)
+        return self.scheduler.execute(lambda: self._send_once(method, url, headers, **kwargs), method)
+
+    def request(self, method, url, headers=None, use_cache=True, **kwargs):
+        merged = dict(self._host_headers.get(self._host_key(url), {}))
+        if headers:
+            merged.update(headers)
+        if self.cache is None or method != "GET" or not use_cache:
+            return self._send(method, url, merged, **kwargs)
+
+        key = self.cache.key(url, merged)
+        entry = self.cache.lookup(key)
+        if entry is not None:
+            merged.update(self.cache.validators(entry))
+        response = self._send(method, url, merged, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            with self._cache_lock:
+                self.cache.hits += 1
+            return self.cache.to_response(entry, response)
+        with self._cache_lock:
+            self.cache.misses += 1
+        self.cache.store(key, response)
+        return response
+
+    def get(self, url, headers=None, **kwargs):
+        return self.request("GET", url, headers=headers, **kwargs)
+
+    def head(self, url, headers=None, **kwargs):
+        return self.request("HEAD", url, headers=headers, **kwargs)
+
+    def stats(self):
+        stats = self.adapter.connection_stats()
+        if self.cache is not None:
+            stats["cache_hits"] = self.cache.hits
+            stats["cache_misses"] = self.cache.misses
+        if self.scheduler is not None:
+            stats["retries"] = self.scheduler.retries
+            stats["throttled"] = self.scheduler.throttled
+            stats["concurrency_limit"] = self.scheduler.limiter.limit
+        return stats
+
+    def print_stats(self, file=None):
+        stats = self.stats()
+        print(f"🔌 HTTP 连接: 新建 {stats['connections_opened']}，复用 {stats['connections_reused']}，"
+              f"请求 {stats['requests']}", file=file)
+        if self.cache is not None:
+            print(f"💾 HTTP 缓存: 命中(304) {stats['cache_hits']}，未命中 {stats['cache_misses']}", file=file)
+        if self.scheduler is not None and (stats["retries"] or stats["throttled"]):
+            print(f"⏳ 限流: 受限响应 {stats['throttled']}，重试 {stats['retries']}，"
+                  f"当前并发上限 {stats['concurrency_limit']}", file=file)
+
+    def close(self):
+        self.session.close()
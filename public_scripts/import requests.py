@@ -2,167 +2,170 @@ import requests
 import json
 import argparse
 import sys
-from datetime import datetime
 from urllib.parse import quote
 
-def fetch_paginated_data(url, headers):
-    all_results = []
-    next_page = url
-    while next_page:
-        try:
-            r = requests.get(next_page, headers=headers)
-            r.raise_for_status()
-            data = r.json()
-            all_results.extend(data.get("packages", []) or data.get("results", []) or data)
-            # 处理分页
-            if 'Link' in r.headers:
-                links = r.headers['Link'].split(",")
-                next_url = None
-                for link in links:
-                    if 'rel="next"' in link:
-                        next_url = link[link.find("<")+1:link.find(">")]
-                        break
-                next_page = next_url
-            else:
-                next_page = None
-        except requests.RequestException as e:
-            print(f"❌ 请求失败: {e}", file=sys.stderr)
-            break
-    return all_results
-
-def fetch_versions(namespace, pkg_name, is_org, headers):
+from http_cache import add_cache_arguments, cache_from_args
+from http_client import DEFAULT_POOL_SIZE, GITHUB_API_URL, HttpClient
+from inventory_store import store_from_args
+from metrics import add_metrics_arguments, metrics_from_args
+from pagination import MAX_PER_PAGE, iter_pages
+from rate_limit import add_scheduler_arguments, scheduler_from_args
+from records import ImageRecord, add_table_arguments, print_table, records_to_dicts, stream_renderer
+from result_io import ResultWriter, add_output_arguments, output_path_from_args
+from version_window import add_window_arguments, window_from_args
+
+def fetch_paginated_data(url, client):
+    return list(iter_paginated_data(url, client))
+
+def iter_paginated_data(url, client, window=None):
+    """
+    逐条产出分页数据，处理完一页即可丢弃。
+    请求由调度器限速并重试；重试耗尽后抛出异常，而不是悄悄返回不完整的数据。
+    传入 window 时按版本过滤条件过滤，越过截止条件后不再请求后续页面。
+    """
+    try:
+        if window is None or not window.active:
+            for page in iter_pages(client, url):
+                yield from page
+        else:
+            pages = iter_pages(client, url, per_page=window.page_size(MAX_PER_PAGE), sequential=window.stops_early)
+            yield from window.select(pages)
+    except requests.RequestException as e:
+        print(f"❌ 请求失败: {e}", file=sys.stderr)
+        raise
+
+def versions_url(namespace, pkg_name, is_org):
     encoded_name = quote(pkg_name, safe='')
-    url = f"https://api.github.com/{'orgs' if is_org else 'users'}/{namespace}/packages/container/{encoded_name}/versions"
-    return fetch_paginated_data(url, headers)
+    return f"{GITHUB_API_URL}/{'orgs' if is_org else 'users'}/{namespace}/packages/container/{encoded_name}/versions"
 
 def main():
     parser = argparse.ArgumentParser(description="List GHCR container packages for a namespace.")
     parser.add_argument("--namespace", type=str, required=True, help="GitHub username or organization name")
     parser.add_argument("--org", action="store_true", help="Specify if the namespace is an organization")
     parser.add_argument("--token", type=str, required=True, help="GitHub token with read:packages scope")
+    add_cache_arguments(parser)
+    add_scheduler_arguments(parser)
+    add_window_arguments(parser)
+    add_output_arguments(parser, "ghcr_results")
+    add_table_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
 
-    headers = {
-        "Authorization": f"Bearer {args.token}",
-        "Accept": "application/vnd.github+json"
-    }
-
     if not args.namespace:
         print("错误: --namespace 不能为空", file=sys.stderr)
         sys.exit(1)
+    if args.timeout <= 0:
+        print("错误: --timeout 必须大于 0", file=sys.stderr)
+        sys.exit(1)
+    try:
+        window = window_from_args(args)
+    except ValueError as e:
+        print(f"错误: 无效的版本过滤条件: {e}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        inventory = store_from_args(args, prune=not window.active)
+    except ValueError as e:
+        print(f"错误: 无法打开清单库: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    client = HttpClient(cache=cache_from_args(args), scheduler=scheduler_from_args(args, DEFAULT_POOL_SIZE),
+                        metrics=metrics_from_args(args), timeout=args.timeout)
+    client.set_default_headers(GITHUB_API_URL, {
+        "Authorization": f"Bearer {args.token}",
+        "Accept": "application/vnd.github+json"
+    })
 
     print(f"查询 GHCR 镜像（命名空间: {args.namespace}, 类型: {'组织' if args.org else '用户'}）")
     print("-" * 50)
 
     try:
-        packages = fetch_paginated_data(
-            f"https://api.github.com/{'orgs' if args.org else 'users'}/{args.namespace}/packages?package_type=container",
-            headers)
-    except requests.HTTPError as e:
+        with client.metrics.stage("list_packages"):
+            packages = fetch_paginated_data(
+                f"{GITHUB_API_URL}/{'orgs' if args.org else 'users'}/{args.namespace}/packages?package_type=container",
+                client)
+    except requests.RequestException as e:
         print(f"❌ 获取包列表失败: {e}", file=sys.stderr)
         sys.exit(1)
 
+    output_path = output_path_from_args(args, "ghcr_results")
     if not packages:
         print("⚠️ 未找到任何容器镜像。")
-        print("::set-output name=results_json_path::ghcr_results.json")
-        print("::set-output name=results_json_string::[]")
-        with open("ghcr_results.json", "w") as f:
-            json.dump([], f, indent=2)
+        ResultWriter(output_path, args.format).close()
+        if inventory is not None:
+            inventory.close()
+        print(f"::set-output name=results_json_path::{output_path}")
+        if not args.stream:
+            print("::set-output name=results_json_string::[]")
+        client.metrics.finish(client)
         return
 
     results = []
-    table_data = []
+    writer = ResultWriter(output_path, args.format)
+    renderer = stream_renderer(args.max_column_width)
+
+    def emit(record):
+        # 记录立即写入文件；流式模式下不在内存中保留行
+        writer.write(record)
+        if inventory is not None:
+            inventory.write(record)
+        if args.stream:
+            renderer.print_row(record)
+        else:
+            results.append(record)
+
+    def process_version(name, version):
+        tag_names = version.get("metadata", {}).get("container", {}).get("tags", [])
+        if not tag_names:
+            tag_names = ["latest"]
+
+        pushed_at = version.get("updated_at") or version.get("created_at") or "N/A"
+        digest = version.get("name") or "N/A"
+        size_bytes = version.get("metadata", {}).get("container", {}).get("size", 0)
+        architectures = []  # 这里保持空列表，跟dockerhub脚本一致
+
+        for tag in tag_names:
+            emit(ImageRecord(f"ghcr.io/{args.namespace}/{name}", tag, digest, pushed_at, size_bytes, architectures))
 
     for pkg in packages:
         name = pkg.get("name")
         print(f"📦 镜像: ghcr.io/{args.namespace}/{name}")
+        if not window.package_changed_since(pkg.get("updated_at")):
+            print("  ⏭️ 过滤条件内没有版本。")
+            continue
+        version_count = 0
         try:
-            versions = fetch_versions(args.namespace, name, args.org, headers)
-        except requests.HTTPError as e:
+            with client.metrics.stage("versions"):
+                for version in iter_paginated_data(versions_url(args.namespace, name, args.org), client, window):
+                    version_count += 1
+                    process_version(name, version)
+        except requests.RequestException as e:
             print(f"  ❌ 获取版本失败: {e}", file=sys.stderr)
             continue
 
-        if not versions:
+        if not version_count and window.active:
+            print("  ⏭️ 过滤条件内没有版本。")
+        elif not version_count:
             print("  ⚠️ 没有标签版本。")
             # 对应无版本的条目，保持输出一致
-            table_data.append({
-                "Image:Tag": f"ghcr.io/{args.namespace}/{name}:(No Tags)",
-                "ID (digest)": "N/A",
-                "Pushed At": "N/A",
-                "Size": "N/A",
-                "Architectures": "N/A"
-            })
-            results.append({
-                "image_name": f"ghcr.io/{args.namespace}/{name}",
-                "tag": "(No Tags)",
-                "digest": "N/A",
-                "pushed_at": "N/A",
-                "size_bytes": 0,
-                "size_mb": 0.0,
-                "architectures": []
-            })
-            continue
+            emit(ImageRecord.no_tags(f"ghcr.io/{args.namespace}/{name}"))
 
-        for version in versions:
-            tag_names = version.get("metadata", {}).get("container", {}).get("tags", [])
-            if not tag_names:
-                tag_names = ["latest"]
-
-            pushed_at = version.get("updated_at") or version.get("created_at") or "N/A"
-            digest = version.get("name") or "N/A"
-            size_bytes = version.get("metadata", {}).get("container", {}).get("size", 0)
-            size_mb = float(size_bytes) / (1024 * 1024) if size_bytes else 0.0
-
-            formatted_pushed_at = "N/A"
-            if pushed_at != "N/A":
-                try:
-                    dt_object = datetime.strptime(pushed_at, "%Y-%m-%dT%H:%M:%SZ")
-                    formatted_pushed_at = dt_object.strftime("%Y-%m-%d %H:%M:%S UTC")
-                except Exception:
-                    formatted_pushed_at = pushed_at
-
-            arch_str = "N/A"
-            architectures = []  # 这里保持空列表，跟dockerhub脚本一致
-
-            for tag in tag_names:
-                image_ref = f"ghcr.io/{args.namespace}/{name}"
-                table_data.append({
-                    "Image:Tag": f"{image_ref}:{tag}",
-                    "ID (digest)": digest,
-                    "Pushed At": formatted_pushed_at,
-                    "Size": f"{size_mb:.2f} MB" if size_bytes else "0.00 MB",
-                    "Architectures": arch_str
-                })
-                results.append({
-                    "image_name": image_ref,
-                    "tag": tag,
-                    "digest": digest,
-                    "pushed_at": pushed_at,
-                    "size_bytes": size_bytes,
-                    "size_mb": size_mb,
-                    "architectures": architectures
-                })
+    writer.close()
+    if inventory is not None:
+        inventory.close()
+        print(f"🗄️ 共写入 {inventory.count} 条记录到清单库 {args.store}")
 
     # 打印表格
-    if table_data:
-        headers = ["Image:Tag", "ID (digest)", "Pushed At", "Size", "Architectures"]
-        column_widths = {h: len(h) for h in headers}
-        for row in table_data:
-            for h in headers:
-                column_widths[h] = max(column_widths[h], len(str(row.get(h, ""))))
-        print(" | ".join(h.ljust(column_widths[h]) for h in headers))
-        print("-+-".join("-" * column_widths[h] for h in headers))
-        for row in table_data:
-            print(" | ".join(str(row.get(h, "")).ljust(column_widths[h]) for h in headers))
+    if args.stream:
+        print(f"共写出 {writer.count} 条记录到 {output_path}")
     else:
-        print("未找到任何标签版本。")
-
-    output_path = "ghcr_results.json"
-    with open(output_path, "w") as f:
-        json.dump(results, f, indent=2)
+        print_table(results, args.max_column_width)
 
     print(f"::set-output name=results_json_path::{output_path}")
-    print(f"::set-output name=results_json_string::{json.dumps(results)}")
+    if not args.stream:
+        print(f"::set-output name=results_json_string::{json.dumps(records_to_dicts(results))}")
+    client.print_stats()
+    client.metrics.add_counters(packages=len(packages), rows=writer.count)
+    client.metrics.finish(client)
 
 if __name__ == "__main__":
     main()
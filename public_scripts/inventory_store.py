@@ -0,0 +1,301 @@
+"""
+SQLite 镜像清单库（--store sqlite:inventory.db）。
+
+扫描结果按 (image_name, tag) upsert 到 images 表，digest、pushed_at、size_bytes 上都有索引，
+"哪些标签共用这个 digest"、"上周推送的超过 1 GB 的镜像" 这类问题不用再读整个 JSON 文件。
+packages 表记录每个镜像对应包的 updated_at，可以作为 --previous sqlite:inventory.db 的增量扫描快照。
+
+命令行查询：
+    python inventory_store.py query sqlite:inventory.db --digest sha256:...
+    python inventory_store.py query sqlite:inventory.db --since 7d --min-size 1GB
+"""
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import threading
+
+from records import ImageRecord, print_table, records_to_dicts
+
+STORE_SCHEMES = ("sqlite",)
+BATCH_SIZE = 1000
+SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    image_name TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    digest TEXT,
+    pushed_at TEXT,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    size_mb REAL NOT NULL DEFAULT 0,
+    architectures TEXT NOT NULL DEFAULT '[]',
+    seq INTEGER NOT NULL DEFAULT 0,  -- 写入顺序，用于按扫描时的顺序读回一个镜像的行
+    PRIMARY KEY (image_name, tag)
+);
+CREATE INDEX IF NOT EXISTS images_digest ON images (digest);
+CREATE INDEX IF NOT EXISTS images_pushed_at ON images (pushed_at);
+CREATE INDEX IF NOT EXISTS images_size_bytes ON images (size_bytes);
+CREATE TABLE IF NOT EXISTS packages (
+    image_name TEXT PRIMARY KEY,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+UPSERT = """
+INSERT INTO images (image_name, tag, digest, pushed_at, size_bytes, size_mb, architectures, seq)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (image_name, tag) DO UPDATE SET
+    digest = excluded.digest,
+    pushed_at = excluded.pushed_at,
+    size_bytes = excluded.size_bytes,
+    size_mb = excluded.size_mb,
+    architectures = excluded.architectures,
+    seq = excluded.seq
+"""
+COLUMNS = "image_name, tag, digest, pushed_at, size_bytes, size_mb, architectures"
+
+
+def parse_store_spec(spec):
+    """'sqlite:path/to/inventory.db' -> 'path/to/inventory.db'。"""
+    scheme, sep, path = spec.partition(":")
+    if not sep or scheme not in STORE_SCHEMES or not path:
+        raise ValueError(f"unsupported store '{spec}' (expected sqlite:<path>)")
+    return path
+
+
+def is_store_spec(value):
+    return bool(value) and value.startswith(tuple(f"{scheme}:" for scheme in STORE_SCHEMES))
+
+
+def parse_size(value):
+    """'1GB'、'500MB'、'1048576' -> 字节数。"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?B?)\s*", value.upper())
+    if not match:
+        raise ValueError(f"invalid size: {value}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def record_to_row(record):
+    # "N/A" 存成 NULL，索引上的范围查询（pushed_at >= ?）就不会把它算进去
+    return (
+        record.image_name,
+        record.tag,
+        None if record.digest == "N/A" else record.digest,
+        None if record.pushed_at == "N/A" else record.pushed_at,
+        record.size_bytes or 0,
+        record.size_mb,
+        json.dumps(record.architectures),
+    )
+
+
+def row_to_record(row):
+    image_name, tag, digest, pushed_at, size_bytes, _, architectures = row
+    return ImageRecord(image_name, tag, digest or "N/A", pushed_at or "N/A", size_bytes, json.loads(architectures))
+
+
+class InventoryStore:
+    """
+    线程安全的 SQLite 清单库。写入按批提交；prune=True 时，本次扫描过的镜像中
+    没有再出现的标签会在 close() 时删除（--since 等只扫描部分版本的运行应关闭 prune）。
+    接口与 result_io.ResultWriter 相同（write / write_many / close / count）。
+    """
+
+    def __init__(self, path, prune=True):
+        self.path = path
+        self.prune = prune
+        self.count = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (image_name TEXT, tag TEXT, "
+                           "PRIMARY KEY (image_name, tag))")
+
+    @classmethod
+    def open(cls, spec, prune=True):
+        return cls(parse_store_spec(spec), prune=prune)
+
+    # --- 写入 ---
+    def write(self, record):
+        with self._lock:
+            self._pending.append(record_to_row(record) + (self.count,))
+            self.count += 1
+            if len(self._pending) >= BATCH_SIZE:
+                self._flush()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def _flush(self):
+        if not self._pending:
+            return
+        with self._conn:
+            self._conn.executemany(UPSERT, self._pending)
+            self._conn.executemany("INSERT OR IGNORE INTO seen VALUES (?, ?)",
+                                   [row[:2] for row in self._pending])
+        self._pending = []
+
+    def write_index(self, package_updated_at, filters=None):
+        """记录包的 updated_at 和过滤条件，供下次 --previous sqlite:... 增量扫描。"""
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO packages VALUES (?, ?) ON CONFLICT (image_name) "
+                                   "DO UPDATE SET updated_at = excluded.updated_at",
+                                   list(package_updated_at.items()))
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('filters', ?)", (json.dumps(filters),))
+
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            self._flush()
+            if self.prune:
+                with self._conn:
+                    self._conn.execute(
+                        "DELETE FROM images WHERE image_name IN (SELECT image_name FROM seen) "
+                        "AND NOT EXISTS (SELECT 1 FROM seen WHERE seen.image_name = images.image_name "
+                        "AND seen.tag = images.tag)")
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- 读取 ---
+    def filters(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'filters'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def package_updated_at(self, image_name):
+        with self._lock:
+            row = self._conn.execute("SELECT updated_at FROM packages WHERE image_name = ?",
+                                     (image_name,)).fetchone()
+        return row[0] if row else None
+
+    def rows_for_image(self, image_name):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {COLUMNS} FROM images WHERE image_name = ? ORDER BY seq",
+                                      (image_name,)).fetchall()
+        return [row_to_record(row) for row in rows]
+
+    def iter_records(self):
+        """按镜像逐批读出全部记录（同一镜像内按扫描时的顺序），不把整个库读进内存。"""
+        with self._lock:
+            cursor = self._conn.execute(f"SELECT {COLUMNS} FROM images ORDER BY image_name, seq")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield row_to_record(row)
+
+    def query(self, digest=None, image=None, tag=None, since=None, min_size=None, limit=None):
+        clauses, params = [], []
+        if digest:
+            clauses.append("digest = ?")
+            params.append(digest)
+        if image:
+            clauses.append("image_name = ?")
+            params.append(image)
+        if tag:
+            clauses.append("tag = ?")
+            params.append(tag)
+        if since:
+            clauses.append("pushed_at >= ?")
+            params.append(since)
+        if min_size is not None:
+            clauses.append("size_bytes >= ?")
+            params.append(min_size)
+        sql = f"SELECT {COLUMNS} FROM images"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY pushed_at DESC, image_name, tag"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            rows = cursor.fetchall()
+        return [row_to_record(row) for row in rows]
+
+
+class StoreSnapshot:
+    """以清单库为来源的快照：按需查询单个镜像的行，不把整个库读进内存。"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def reusable_rows(self, image_name, updated_at):
+        if not updated_at or self.store.package_updated_at(image_name) != updated_at:
+            return None
+        return self.store.rows_for_image(image_name) or None
+
+
+def store_from_args(args, prune=True):
+    """未指定 --store 时返回 None；无法打开时抛出 ValueError。"""
+    if not args.store:
+        return None
+    try:
+        return InventoryStore.open(args.store, prune=prune)
+    except sqlite3.Error as e:
+        raise ValueError(f"cannot open {args.store}: {e}") from e
+
+
+def query_main(argv):
+    # 延迟导入，query 子命令之外用不到
+    from version_window import parse_since
+
+    parser = argparse.ArgumentParser(prog="inventory_store.py query",
+                                     description="Query an inventory store written with --store.")
+    parser.add_argument("store", help="Store to query, e.g. sqlite:inventory.db")
+    parser.add_argument("--digest", help="Only rows with this digest (which tags share it)")
+    parser.add_argument("--image", help="Only rows of this image_name, e.g. ghcr.io/org/app")
+    parser.add_argument("--tag", help="Only rows with this tag")
+    parser.add_argument("--since", help="Only rows pushed at or after this time (ISO date/time or 24h, 7d, ...)")
+    parser.add_argument("--min-size", help="Only rows at least this large, e.g. 1GB, 500MB")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of rows")
+    parser.add_argument("--format", choices=("table", "json", "ndjson"), default="table")
+    args = parser.parse_args(argv)
+
+    try:
+        since = parse_since(args.since).strftime("%Y-%m-%dT%H:%M:%SZ") if args.since else None
+        min_size = parse_size(args.min_size) if args.min_size else None
+        store = InventoryStore.open(args.store, prune=False)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    with store:
+        records = store.query(args.digest, args.image, args.tag, since, min_size, args.limit)
+    if args.format == "json":
+        print(json.dumps(records_to_dicts(records), indent=2))
+    elif args.format == "ndjson":
+        for record in records:
+            print(json.dumps(record.to_dict()))
+    else:
+        print_table(records)
+        print(f"共 {len(records)} 条记录")
+
+
+def main():
+    commands = {"query": query_main}
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print(f"用法: python {sys.argv[0]} {{{','.join(commands)}}} ...", file=sys.stderr)
+        sys.exit(2)
+    commands[sys.argv[1]](sys.argv[2:])
+
+
+if __name__ == "__main__":
+    main()
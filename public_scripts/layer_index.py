@@ -0,0 +1,135 @@
+"""
+按层 digest 去重的存储统计（--layer-report layers.json）。
+
+按标签把 manifest 的 layers[].size 相加时，共用的基础层会被每个标签重复计算一次，
+得到的大小远大于实际占用。LayerIndex 以层 digest 为键，在扫描过程中逐个加入 manifest：
+每个 manifest digest 只展开一次，每个层在每个包 / 命名空间中只计一次，
+随时可以得到各包、各命名空间实际占用的字节数，以及被多个包共用的层。
+manifest 通过 manifest_store.ManifestStore 获取，与 --arch 共用同一份按 digest 的缓存。
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_SHARED_LIMIT = 100
+
+
+def namespace_of(image_ref):
+    """ghcr.io/<owner>/<package> -> ghcr.io/<owner>；包名本身可以含 /（ghcr.io/<owner>/repo/image）。"""
+    return "/".join(image_ref.split("/", 2)[:2])
+
+
+class LayerIndex:
+    def __init__(self, store):
+        self.store = store
+        self._sizes = {}  # 层 digest -> 字节数
+        self._layer_packages = {}  # 层 digest -> {image_ref, ...}
+        self._layer_namespaces = {}  # 层 digest -> {namespace, ...}
+        self._package_bytes = {}  # image_ref -> 去重后的字节数
+        self._package_layers = {}  # image_ref -> 层数
+        self._naive_bytes = {}  # image_ref -> 按标签累加的字节数（对照用）
+        self._namespace_bytes = {}
+        self._manifests = set()  # 已加入的 (image_ref, manifest digest)
+        self._lock = threading.Lock()
+
+    def add(self, image_ref, manifest_digest, blobs, tags=1):
+        """加入一个 manifest 的 [(blob digest, size), ...]；tags 为指向它的标签数，只用于对照的累加值。"""
+        namespace = namespace_of(image_ref)
+        with self._lock:
+            self._naive_bytes[image_ref] = self._naive_bytes.get(image_ref, 0) + tags * sum(s for _, s in blobs)
+            if (image_ref, manifest_digest) in self._manifests:
+                return
+            self._manifests.add((image_ref, manifest_digest))
+            for digest, size in blobs:
+                size = self._sizes.setdefault(digest, size)
+                packages = self._layer_packages.setdefault(digest, set())
+                if image_ref in packages:
+                    continue
+                packages.add(image_ref)
+                self._package_bytes[image_ref] = self._package_bytes.get(image_ref, 0) + size
+                self._package_layers[image_ref] = self._package_layers.get(image_ref, 0) + 1
+                namespaces = self._layer_namespaces.setdefault(digest, set())
+                if namespace not in namespaces:
+                    namespaces.add(namespace)
+                    self._namespace_bytes[namespace] = self._namespace_bytes.get(namespace, 0) + size
+
+    def add_rows(self, rows, workers):
+        """
+        把一个包的结果行加入索引：按 digest 去重后并发获取 manifest（多架构镜像展开到子 manifest），
+        共用同一 digest 的标签只获取一次。获取失败的 digest 跳过并打印警告。
+        """
+        tags_by_digest = {}
+        for row in rows:
+            if row.digest != "N/A":
+                tags_by_digest[row.digest] = tags_by_digest.get(row.digest, 0) + 1
+        if not tags_by_digest:
+            return
+        image_ref = rows[0].image_name
+        repo = image_ref.split("/", 1)[1].lower()
+
+        def fetch(digest):
+            try:
+                return self.store.blobs(repo, digest)
+            except (requests.RequestException, ValueError) as e:
+                print(f"  ⚠️ 获取 {digest} 的层失败: {e}")
+                return None
+
+        digests = list(tags_by_digest)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for digest, blobs in zip(digests, executor.map(fetch, digests)):
+                if blobs is not None:
+                    self.add(image_ref, digest, blobs, tags_by_digest[digest])
+
+    def package_bytes(self, image_ref):
+        return self._package_bytes.get(image_ref, 0)
+
+    def namespace_bytes(self, namespace):
+        return self._namespace_bytes.get(namespace, 0)
+
+    def shared_layers(self, limit=DEFAULT_SHARED_LIMIT):
+        """被多个包共用的层，按重复计算的字节数（size × (包数 - 1)）从大到小排列。"""
+        with self._lock:
+            shared = [(digest, self._sizes[digest], sorted(packages))
+                      for digest, packages in self._layer_packages.items() if len(packages) > 1]
+        shared.sort(key=lambda item: item[1] * (len(item[2]) - 1), reverse=True)
+        return [{"digest": digest, "size_bytes": size, "packages": packages}
+                for digest, size, packages in shared[:limit]]
+
+    def report(self, shared_limit=DEFAULT_SHARED_LIMIT):
+        with self._lock:
+            packages = {
+                image_ref: {
+                    "unique_bytes": unique,
+                    "layers": self._package_layers.get(image_ref, 0),
+                    "per_tag_sum_bytes": self._naive_bytes.get(image_ref, 0),
+                }
+                for image_ref, unique in sorted(self._package_bytes.items())
+            }
+            namespaces = {namespace: {"unique_bytes": unique, "packages": 0, "per_tag_sum_bytes": 0}
+                          for namespace, unique in sorted(self._namespace_bytes.items())}
+            for image_ref, entry in packages.items():
+                namespace = namespaces[namespace_of(image_ref)]
+                namespace["packages"] += 1
+                namespace["per_tag_sum_bytes"] += entry["per_tag_sum_bytes"]
+            total = sum(self._sizes.values())
+        return {
+            "total_unique_bytes": total,
+            "namespaces": namespaces,
+            "packages": packages,
+            "shared_layers": self.shared_layers(shared_limit),
+        }
+
+    def write_report(self, path, shared_limit=DEFAULT_SHARED_LIMIT):
+        report = self.report(shared_limit)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+
+def print_report_summary(report, path):
+    for namespace, entry in report["namespaces"].items():
+        print(f"🧱 {namespace}: 实际占用 {entry['unique_bytes'] / (1024 * 1024):.2f} MB"
+              f"（按标签累加 {entry['per_tag_sum_bytes'] / (1024 * 1024):.2f} MB，{entry['packages']} 个包）")
+    print(f"🧱 跨包共享的层 {len(report['shared_layers'])} 个，层存储报告已写入 {path}")
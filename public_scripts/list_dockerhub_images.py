@@ -1,195 +1,217 @@
 import requests
 import json
-from datetime import datetime
+import os
+import re
 import sys
 import argparse
 
-def fetch_paginated_data(url, headers=None):
+from http_cache import add_cache_arguments, cache_from_args
+from http_client import DOCKERHUB_API_URL, HttpClient
+from inventory_store import store_from_args
+from manifest_store import format_platform
+from metrics import add_metrics_arguments, metrics_from_args
+from pagination import DEFAULT_PAGE_WORKERS, MAX_PER_PAGE, iter_counted_pages
+from rate_limit import add_scheduler_arguments, scheduler_from_args
+from records import ImageRecord, add_table_arguments, print_table, records_to_dicts, stream_renderer
+from result_io import ResultWriter, TeeWriter, add_output_arguments, output_path_from_args
+from version_window import VersionWindow, add_window_arguments, window_from_args
+from workers import ordered_map
+
+# Docker Hub 的时间带微秒（2024-05-01T12:34:56.123456Z），统一成与 GHCR 结果相同的格式
+FRACTIONAL_SECONDS = re.compile(r"\.\d+Z$")
+
+def login(client, username, password):
+    """用 Docker Hub 用户名和密码（或访问令牌）换取 JWT，之后的请求都带上它。"""
+    r = client.request("POST", f"{DOCKERHUB_API_URL}/v2/users/login",
+                       json={"username": username, "password": password})
+    r.raise_for_status()
+    client.set_default_headers(DOCKERHUB_API_URL, {"Authorization": f"Bearer {r.json()['token']}"})
+
+def fetch_repositories(namespace, client, page_workers=DEFAULT_PAGE_WORKERS):
+    url = f"{DOCKERHUB_API_URL}/v2/repositories/{namespace}/"
+    repositories = []
+    for page in iter_counted_pages(client, url, workers=page_workers):
+        repositories.extend(page)
+    return repositories
+
+def fetch_tag_pages(namespace, repo_name, client, page_workers=DEFAULT_PAGE_WORKERS, window=None):
+    window = window or VersionWindow()
+    url = f"{DOCKERHUB_API_URL}/v2/repositories/{namespace}/{repo_name}/tags"
+    if window.stops_early:
+        # 提前停止依赖按 last_updated 倒序
+        url += "?ordering=last_updated"
+    return iter_counted_pages(client, url, page_size=window.page_size(MAX_PER_PAGE), workers=page_workers,
+                              sequential=window.stops_early)
+
+def tag_pushed_at(tag):
+    return tag.get("tag_last_pushed") or tag.get("last_updated")
+
+def tag_updated_at(tag):
+    # ordering=last_updated 的排序字段，只有它能用来判断后面的页面是否还需要
+    return tag.get("last_updated")
+
+def normalize_pushed_at(value):
+    if not value:
+        return "N/A"
+    return FRACTIONAL_SECONDS.sub("Z", value)
+
+def build_repo_rows(image_ref, tags):
     """
-    通用函数，用于从支持分页的 API 获取所有数据。
+    把一个仓库的标签展开成结果行。大小、digest 和架构都直接取自标签接口的返回，
+    不需要再请求 manifest。
     """
-    all_results = []
-    next_page = url
-    while next_page:
-        try:
-            response = requests.get(next_page, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            all_results.extend(data.get("packages", []) or data.get("results", []))
-            next_page = None
-            # GitHub REST API分页通过 Link header给出，这里简单处理翻页
-            if 'Link' in response.headers:
-                links = response.headers['Link'].split(",")
-                next_url = None
-                for link in links:
-                    if 'rel="next"' in link:
-                        next_url = link[link.find("<")+1:link.find(">")]
-                        break
-                next_page = next_url
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching data from {next_page}: {e}")
-            print(f"Response status: {response.status_code if 'response' in locals() else 'N/A'}")
-            print(f"Response content: {response.text if 'response' in locals() else 'N/A'}")
-            break
-    return all_results
-
-def get_manifest_and_size(repo_name, tag, token):
+    rows = []
+    for tag in tags:
+        # 多架构镜像的 attestation 条目以 unknown/unknown 出现在 images 里
+        images = [image for image in tag.get("images") or []
+                  if image.get("architecture") not in (None, "unknown")]
+        digest = tag.get("digest") or (images[0].get("digest") if len(images) == 1 else None) or "N/A"
+        rows.append(ImageRecord(image_ref, tag.get("name"), digest, normalize_pushed_at(tag_pushed_at(tag)),
+                                tag.get("full_size") or 0,
+                                list(dict.fromkeys(format_platform(image) for image in images))))
+    if not rows:
+        rows.append(ImageRecord.no_tags(image_ref))
+    return rows
+
+def scan_repository(namespace, repo, client, page_workers=DEFAULT_PAGE_WORKERS, window=None):
     """
-    通过 Docker Registry API v2 获取指定镜像标签的 manifest，计算总大小。
+    在工作线程中获取一个仓库的全部标签；返回 (image_ref, rows, error)。
+    设置了过滤条件时，窗口内没有标签的仓库返回空的 rows。
     """
-    url = f"https://ghcr.io/v2/{repo_name}/manifests/{tag}"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.docker.distribution.manifest.v2+json, application/vnd.oci.image.manifest.v1+json"
-    }
+    window = window or VersionWindow()
+    image_ref = f"docker.io/{namespace}/{repo.get('name')}"
+    if not window.package_changed_since(repo.get("last_updated")):
+        return image_ref, [], None
     try:
-        resp = requests.get(url, headers=headers)
-        resp.raise_for_status()
-        manifest = resp.json()
-        layers = manifest.get("layers", [])
-        size_bytes = sum(layer.get("size", 0) for layer in layers)
-        digest = manifest.get("config", {}).get("digest", "N/A")
-        return digest, size_bytes
-    except requests.exceptions.RequestException as e:
-        print(f"  ❌ 获取 manifest 失败: {e}")
-        return "N/A", 0
+        with client.metrics.stage("fetch_tags"):
+            pages = fetch_tag_pages(namespace, repo.get("name"), client, page_workers, window)
+            if window.active:
+                # Docker Hub 只列出有标签的镜像，--tagged-only 不影响结果；
+                # 按 last_updated 判断何时停止翻页，--since 再按推送时间过滤（推送时间不晚于 last_updated）
+                tags = list(window.select(pages, date_of=tag_updated_at, tagged=lambda tag: True,
+                                          include=lambda tag: window.includes(tag_pushed_at(tag))))
+                if not tags:
+                    return image_ref, [], None
+            else:
+                tags = [tag for page in pages for tag in page]
+    except requests.RequestException as e:
+        return image_ref, None, e
+    with client.metrics.stage("build_rows"):
+        rows = build_repo_rows(image_ref, tags)
+    return image_ref, rows, None
 
 def main():
-    parser = argparse.ArgumentParser(description="List GHCR container images for a given org namespace.")
+    parser = argparse.ArgumentParser(description="List Docker Hub repositories and tags for a namespace.")
     parser.add_argument('--namespace', type=str, required=True,
-                        help='GitHub organization name (namespace).')
-    parser.add_argument('--token', type=str, required=True,
-                        help='GitHub personal access token with read:packages scope.')
-    
+                        help='Docker Hub user or organization name (namespace).')
+    parser.add_argument('--username', type=str, default=os.environ.get("DOCKER_USERNAME"),
+                        help='Docker Hub username for private repositories and higher rate limits '
+                             '(default: $DOCKER_USERNAME).')
+    parser.add_argument('--password', type=str, default=os.environ.get("DOCKER_PASSWORD"),
+                        help='Docker Hub password or access token (default: $DOCKER_PASSWORD).')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Number of repositories to fetch tags for in parallel.')
+    parser.add_argument('--page-concurrency', type=int, default=DEFAULT_PAGE_WORKERS,
+                        help='Number of pages to fetch in parallel per paginated listing.')
+    add_cache_arguments(parser)
+    add_scheduler_arguments(parser)
+    add_window_arguments(parser)
+    add_output_arguments(parser, "dockerhub_results")
+    add_table_arguments(parser)
+    add_metrics_arguments(parser)
+
     args = parser.parse_args()
 
     namespace = args.namespace
-    token = args.token
-
-    if not namespace or not token:
-        print("错误: 必须提供 --namespace 和 --token 参数。", file=sys.stderr)
+    if not namespace:
+        print("错误: 必须提供 --namespace 参数。", file=sys.stderr)
+        sys.exit(1)
+    if args.concurrency < 1 or args.page_concurrency < 1:
+        print("错误: --concurrency 和 --page-concurrency 必须大于 0", file=sys.stderr)
+        sys.exit(1)
+    if args.timeout <= 0:
+        print("错误: --timeout 必须大于 0", file=sys.stderr)
+        sys.exit(1)
+    try:
+        window = window_from_args(args)
+    except ValueError as e:
+        print(f"错误: 无效的版本过滤条件: {e}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        inventory = store_from_args(args, prune=not window.active)
+    except ValueError as e:
+        print(f"错误: 无法打开清单库: {e}", file=sys.stderr)
         sys.exit(1)
 
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.github+json"
-    }
-
-    print(f"查询 GHCR 镜像（命名空间: {namespace}，类型: 组织）")
-    print("-" * 50)
-
-    # --- 获取容器包列表 ---
-    packages_url = f"https://api.github.com/orgs/{namespace}/packages?package_type=container"
-    packages = fetch_paginated_data(packages_url, headers=headers)
-
-    if not packages:
-        print(f"命名空间 '{namespace}' 下未找到任何容器包。")
-        print(f"::set-output name=results_json_path::ghcr_results.json")
-        print(f"::set-output name=results_json_string::{json.dumps([])}")
-        with open("ghcr_results.json", 'w') as f:
-            json.dump([], f, indent=2)
-        return
+    pool_size = args.concurrency * args.page_concurrency
+    client = HttpClient(pool_size=pool_size, cache=cache_from_args(args),
+                        scheduler=scheduler_from_args(args, pool_size), metrics=metrics_from_args(args),
+                        timeout=args.timeout)
+    if args.username and args.password:
+        try:
+            login(client, args.username, args.password)
+        except (requests.RequestException, KeyError, ValueError) as e:
+            print(f"❌ Docker Hub 登录失败: {e}", file=sys.stderr)
+            sys.exit(1)
 
-    print(f"找到 {len(packages)} 个容器包。")
+    print(f"查询 Docker Hub 镜像（命名空间: {namespace}）")
     print("-" * 50)
 
-    table_data = []
-    json_output_data = []
-
-    # --- 处理每个包及其标签（版本） ---
-    for pkg in packages:
-        package_name = pkg.get("name")
-        full_package_name = f"{namespace}/{package_name}"
+    # --- 获取仓库列表 ---
+    try:
+        with client.metrics.stage("list_repositories"):
+            repositories = fetch_repositories(namespace, client, args.page_concurrency)
+    except requests.RequestException as e:
+        print(f"❌ 获取仓库列表失败: {e}", file=sys.stderr)
+        sys.exit(1)
 
-        tags_url = f"https://api.github.com/orgs/{namespace}/packages/container/{package_name}/versions"
-        try:
-            resp = requests.get(tags_url, headers=headers)
-            resp.raise_for_status()
-            versions = resp.json()
-        except requests.exceptions.RequestException as e:
-            print(f"📦 镜像: ghcr.io/{namespace}/{package_name}")
-            print(f"  ❌ 获取版本失败: {e}")
-            continue
-
-        if not versions:
-            table_data.append({
-                "Image:Tag": f"ghcr.io/{namespace}/{package_name}: (No Tags)",
-                "ID (digest)": "N/A", "Pushed At": "N/A",
-                "Size": "N/A", "Architectures": "N/A"
-            })
-            json_output_data.append({
-                "image_name": f"ghcr.io/{namespace}/{package_name}",
-                "tag": "(No Tags)", "digest": "N/A",
-                "pushed_at": "N/A", "size_bytes": 0,
-                "size_mb": 0.0, "architectures": []
-            })
-            continue
-
-        for version in versions:
-            tag_name = version.get("metadata", {}).get("container", {}).get("tags", [])
-            tag_name = tag_name[0] if tag_name else "latest"
-            pushed_at = version.get("updated_at") or version.get("created_at") or "N/A"
-
-            # 获取 manifest 及大小
-            digest, size_bytes = get_manifest_and_size(package_name, tag_name, token)
-
-            formatted_pushed_at = "N/A"
-            if pushed_at != "N/A":
-                try:
-                    dt_object = datetime.strptime(pushed_at, "%Y-%m-%dT%H:%M:%SZ")
-                    formatted_pushed_at = dt_object.strftime("%Y-%m-%d %H:%M:%S UTC")
-                except Exception:
-                    formatted_pushed_at = pushed_at
-
-            size_mb = float(size_bytes) / (1024 * 1024) if size_bytes else 0.0
-            size_mb_str = f"{size_mb:.2f} MB" if size_bytes else "0.00 MB"
-
-            # 架构信息 GHCR API不直接返回，需要从manifest或者metadata里解析（这里示例简化为 N/A）
-            arch_str = "N/A"
-            architectures = []
-
-            image_ref = f"ghcr.io/{namespace}/{package_name}"
-
-            table_data.append({
-                "Image:Tag": f"{image_ref}:{tag_name}",
-                "ID (digest)": digest,
-                "Pushed At": formatted_pushed_at,
-                "Size": size_mb_str,
-                "Architectures": arch_str
-            })
-
-            json_output_data.append({
-                "image_name": image_ref,
-                "tag": tag_name,
-                "digest": digest,
-                "pushed_at": pushed_at,
-                "size_bytes": size_bytes,
-                "size_mb": size_mb,
-                "architectures": architectures
-            })
-
-    if table_data:
-        headers = ["Image:Tag", "ID (digest)", "Pushed At", "Size", "Architectures"]
-        column_widths = {header: len(header) for header in headers}
-        for row in table_data:
-            for header in headers:
-                column_widths[header] = max(column_widths[header], len(str(row.get(header, ""))))
-
-        header_line = " | ".join(header.ljust(column_widths[header]) for header in headers)
-        print(header_line)
-        print("-+-".join("-" * column_widths[header] for header in headers))
-        for row in table_data:
-            row_line = " | ".join(str(row.get(header, "")).ljust(column_widths[header]) for header in headers)
-            print(row_line)
+    output_json_path = output_path_from_args(args, "dockerhub_results")
+    results = None if args.stream else []
+    with ResultWriter(output_json_path, args.format) as writer:
+        sink = TeeWriter(writer, inventory)
+        if not repositories:
+            print(f"命名空间 '{namespace}' 下未找到任何仓库。")
+        else:
+            print(f"找到 {len(repositories)} 个仓库。")
+            print("-" * 50)
+
+        # 并发获取各仓库的标签，ordered_map 按仓库列表的顺序返回
+        renderer = stream_renderer(args.max_column_width)
+        scanned = ordered_map(
+            lambda repo: scan_repository(namespace, repo, client, args.page_concurrency, window),
+            repositories, args.concurrency)
+        for image_ref, rows, error in scanned:
+            print(f"📦 镜像: {image_ref}")
+            if error is not None:
+                print(f"  ❌ 获取标签失败: {error}")
+                continue
+            if not rows:
+                print("  ⏭️ 过滤条件内没有标签。")
+            elif not rows[0].has_tags:
+                print("  ⚠️ 没有标签。")
+
+            with client.metrics.stage("write_output"):
+                sink.write_many(rows)
+            client.metrics.add_counters(repositories=1, rows=len(rows))
+            if results is None:
+                renderer.print_rows(rows)
+            else:
+                results.extend(rows)
+
+    if results is None:
+        print(f"共写出 {writer.count} 条记录到 {output_json_path}")
     else:
-        print("未找到任何镜像标签。")
-
-    output_json_path = "ghcr_results.json"
-    with open(output_json_path, 'w') as f:
-        json.dump(json_output_data, f, indent=2)
+        with client.metrics.stage("render_table"):
+            print_table(results, args.max_column_width)
+    if inventory is not None:
+        inventory.close()
+        print(f"🗄️ 共写入 {inventory.count} 条记录到清单库 {args.store}")
 
     print(f"::set-output name=results_json_path::{output_json_path}")
-    print(f"::set-output name=results_json_string::{json.dumps(json_output_data)}")
+    if results is not None:
+        print(f"::set-output name=results_json_string::{json.dumps(records_to_dicts(results))}")
+    client.print_stats()
+    client.metrics.finish(client)
 
 if __name__ == "__main__":
     main()
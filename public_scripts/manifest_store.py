@@ -0,0 +1,212 @@
+"""
+按 digest 寻址的镜像 manifest 缓存（内存 + 磁盘目录）。
+
+digest 寻址的 manifest 内容不可变，取过一次就永远不用再下载。
+按标签查询时先用 HEAD 请求读取 Docker-Content-Digest 把标签解析为 digest，
+只有缓存未命中时才下载 manifest 正文。
+同一目录下还缓存镜像 config blob，用于解析单架构镜像的 architecture。
+registry 的认证交给 registry_auth.RegistryAuth（按仓库 scope 换取并缓存 Bearer token）。
+"""
+import hashlib
+import json
+import os
+import threading
+
+from http_client import GHCR_REGISTRY_URL
+
+SINGLE_MANIFEST_TYPES = (
+    "application/vnd.docker.distribution.manifest.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+)
+INDEX_MANIFEST_TYPES = (
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.index.v1+json",
+)
+ALL_MANIFEST_TYPES = SINGLE_MANIFEST_TYPES + INDEX_MANIFEST_TYPES
+
+
+def is_digest(reference):
+    return reference.startswith("sha256:")
+
+
+class ManifestStore:
+    def __init__(self, client, cache_dir=None, auth=None, registry_url=GHCR_REGISTRY_URL):
+        self.client = client
+        self.cache_dir = cache_dir
+        self.auth = auth
+        self.registry_url = registry_url
+        self._manifests = {}  # digest -> manifest dict
+        self._tags = {}  # (repo, tag, accept) -> digest，标签可变，只在本次运行内有效
+        self._blobs = {}  # manifest digest -> [(blob digest, size), ...]
+        self._configs = {}  # config digest -> config dict
+        self._architectures = {}  # manifest digest -> [platform, ...]
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _headers(accept):
+        return {"Accept": ", ".join(accept)}
+
+    def _request(self, method, repo, url, headers=None):
+        if self.auth is None:
+            return self.client.request(method, url, headers=headers, use_cache=False)
+        return self.auth.request(method, url, repo, headers=headers)
+
+    def prefetch_auth(self, repos):
+        """一次性为多个仓库换取 token（没有配置认证时什么也不做）。"""
+        if self.auth is not None:
+            self.auth.prefetch(self.registry_url, repos)
+
+    def _disk_path(self, digest, kind="manifests"):
+        algorithm, _, hex_digest = digest.partition(":")
+        return os.path.join(self.cache_dir, kind, algorithm, f"{hex_digest}.json")
+
+    def _read_disk(self, digest, kind="manifests"):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(digest, kind), "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, digest, body, kind="manifests"):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(digest, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    def _remember(self, digest, manifest, body=None):
+        with self._lock:
+            self._manifests[digest] = manifest
+        if body is not None:
+            self._write_disk(digest, body)
+
+    def cached(self, digest):
+        """只查内存和磁盘，不发网络请求。"""
+        manifest = self._manifests.get(digest)
+        if manifest is None:
+            manifest = self._read_disk(digest)
+            if manifest is not None:
+                self._remember(digest, manifest)
+        return manifest
+
+    def resolve_tag(self, repo, tag, accept=ALL_MANIFEST_TYPES):
+        """HEAD 请求读取 Docker-Content-Digest，把标签解析为 digest。"""
+        key = (repo, tag, accept)
+        digest = self._tags.get(key)
+        if digest:
+            return digest
+        url = f"{self.registry_url}/v2/{repo}/manifests/{tag}"
+        r = self._request("HEAD", repo, url, self._headers(accept))
+        r.raise_for_status()
+        digest = r.headers.get("Docker-Content-Digest")
+        if not digest:
+            # 个别 registry 的 HEAD 不返回 digest，只能下载正文自己算
+            digest, _ = self._fetch(repo, tag, accept)
+        with self._lock:
+            self._tags[key] = digest
+        return digest
+
+    def _fetch(self, repo, reference, accept):
+        url = f"{self.registry_url}/v2/{repo}/manifests/{reference}"
+        r = self._request("GET", repo, url, self._headers(accept))
+        r.raise_for_status()
+        body = r.content
+        if is_digest(reference):
+            digest = reference
+        else:
+            digest = r.headers.get("Docker-Content-Digest") or f"sha256:{hashlib.sha256(body).hexdigest()}"
+        manifest = json.loads(body)
+        self._remember(digest, manifest, body)
+        return digest, manifest
+
+    def get(self, repo, reference, accept=ALL_MANIFEST_TYPES):
+        """返回 (digest, manifest)；reference 可以是标签或 digest。"""
+        digest = reference if is_digest(reference) else self.resolve_tag(repo, reference, accept)
+        manifest = self.cached(digest)
+        if manifest is None:
+            digest, manifest = self._fetch(repo, digest, accept)
+        return digest, manifest
+
+    def blobs(self, repo, reference):
+        """
+        返回 manifest 引用的 [(blob digest, size), ...]（config 和各层）；manifest list / OCI index
+        展开到各子 manifest，同一个 blob 只出现一次。按 manifest digest 记忆。
+        """
+        digest, manifest = self.get(repo, reference, ALL_MANIFEST_TYPES)
+        result = self._blobs.get(digest)
+        if result is not None:
+            return result
+        if manifest.get("mediaType") in INDEX_MANIFEST_TYPES or "manifests" in manifest:
+            sizes = {}
+            for entry in manifest.get("manifests", []):
+                for blob_digest, size in self.blobs(repo, entry["digest"]):
+                    sizes.setdefault(blob_digest, size)
+            result = list(sizes.items())
+        else:
+            entries = [manifest.get("config", {})] + manifest.get("layers", [])
+            result = list({e["digest"]: e.get("size", 0) for e in entries if e.get("digest")}.items())
+        with self._lock:
+            self._blobs[digest] = result
+        return result
+
+    def config(self, repo, config_digest):
+        """获取镜像 config blob（同样按 digest 不可变，可永久缓存）。"""
+        config = self._configs.get(config_digest)
+        if config is None:
+            config = self._read_disk(config_digest, kind="blobs")
+        if config is None:
+            url = f"{self.registry_url}/v2/{repo}/blobs/{config_digest}"
+            r = self._request("GET", repo, url)
+            r.raise_for_status()
+            config = json.loads(r.content)
+            self._write_disk(config_digest, r.content, kind="blobs")
+        with self._lock:
+            self._configs[config_digest] = config
+        return config
+
+    def children(self, repo, reference):
+        """manifest list / OCI index 引用的子 manifest digest（含 attestation）；单架构镜像返回空列表。"""
+        _, manifest = self.get(repo, reference, ALL_MANIFEST_TYPES)
+        return [entry["digest"] for entry in manifest.get("manifests", []) if entry.get("digest")]
+
+    def architectures(self, repo, reference):
+        """
+        解析镜像支持的平台：manifest list / OCI index 读取各子 manifest 的 platform，
+        单架构镜像读取 config blob 中的 architecture。结果按 manifest digest 记忆。
+        """
+        digest, manifest = self.get(repo, reference, ALL_MANIFEST_TYPES)
+        platforms = self._architectures.get(digest)
+        if platforms is not None:
+            return platforms
+
+        if manifest.get("mediaType") in INDEX_MANIFEST_TYPES or "manifests" in manifest:
+            platforms = []
+            for entry in manifest.get("manifests", []):
+                # buildx 的 attestation 条目平台为 unknown/unknown，不算一个架构
+                annotations = entry.get("annotations", {})
+                if annotations.get("vnd.docker.reference.type") == "attestation-manifest":
+                    continue
+                platform = format_platform(entry.get("platform", {}))
+                if platform not in platforms:
+                    platforms.append(platform)
+        else:
+            config_digest = manifest.get("config", {}).get("digest")
+            config = self.config(repo, config_digest) if config_digest else {}
+            platforms = [format_platform(config)]
+
+        with self._lock:
+            self._architectures[digest] = platforms
+        return platforms
+
+
+def format_platform(platform):
+    architecture = platform.get("architecture") or "unknown"
+    variant = platform.get("variant")
+    return f"{architecture}/{variant}" if variant else architecture
@@ -0,0 +1,276 @@
+"""
+运行指标与性能剖析（--metrics out.json、--profile out.prof）。
+
+Metrics 记录：
+- 每个 HTTP 请求（每次尝试）的耗时直方图 / 百分位、字节数、状态码，按 "方法 主机 接口" 分组；
+- 各阶段（包列表、版本、架构解析、输出……）的墙钟耗时（各线程执行区间的并集）和次数，
+  另外给出各线程耗时之和，两者之比约等于该阶段的平均并行度；
+- 结束时从 HttpClient 取连接复用、缓存命中、重试次数，以及峰值 RSS。
+未开启时使用 NULL_METRICS，所有方法都是空操作，可以在生产运行中一直保留埋点。
+--profile 同时剖析主线程和工作线程，结束时合并成一份 pstats 文件。
+"""
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from urllib.parse import urlsplit
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 直方图桶上界（秒）：1ms 起按 1.5 倍递增，最后一个约 190s
+BUCKET_BOUNDS = [0.001 * 1.5 ** i for i in range(30)]
+# 按 URL 路径中的这些词给请求分组
+ENDPOINT_WORDS = ("token", "login", "manifests", "blobs", "versions", "tags", "packages", "repositories")
+
+
+def endpoint_name(method, url):
+    parts = urlsplit(url)
+    segments = [s for s in parts.path.split("/") if s]
+    word = next((s for s in reversed(segments) if s in ENDPOINT_WORDS), "other")
+    return f"{method} {parts.netloc} {word}"
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以 KB 为单位
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.buckets[bisect_left(BUCKET_BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for index, n in enumerate(other.buckets):
+            self.buckets[index] += n
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p):
+        """按桶上界估计百分位（不超过实际最大值）。"""
+        if not self.count:
+            return None
+        target = p / 100 * self.count
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target and n:
+                bound = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+        return {
+            "count": self.count,
+            "total_ms": ms(self.total),
+            "mean_ms": ms(self.total / self.count) if self.count else None,
+            "min_ms": ms(self.min),
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+            "max_ms": ms(self.max),
+        }
+
+
+class StageTimer:
+    """
+    一个阶段的次数、墙钟耗时和线程耗时。多个线程同时处于该阶段时墙钟只算一次：
+    从第一个线程进入到最后一个线程退出算一个区间，墙钟耗时是这些区间的总长（调用方持锁）。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.thread_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.running = 0  # 当前处于该阶段的线程数
+        self.span_start = None
+
+    def enter(self, now):
+        if self.running == 0:
+            self.span_start = now
+        self.running += 1
+
+    def exit(self, start, now):
+        self.count += 1
+        self.thread_seconds += now - start
+        self.running -= 1
+        if self.running == 0:
+            self.wall_seconds += now - self.span_start
+            self.span_start = None
+
+    def summary(self, now):
+        wall = self.wall_seconds + (now - self.span_start if self.span_start is not None else 0)
+        return {"count": self.count, "wall_ms": round(wall * 1000, 2),
+                "thread_ms": round(self.thread_seconds * 1000, 2)}
+
+
+class NullMetrics:
+    """关闭指标时使用的空实现。"""
+    enabled = False
+
+    def observe_request(self, method, url, status, seconds, nbytes):
+        pass
+
+    def stage(self, name):
+        return nullcontext()
+
+    def add_counters(self, **counters):
+        pass
+
+    def finish(self, client=None):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class Metrics:
+    enabled = True
+
+    def __init__(self, path=None, profile_path=None):
+        self.path = path
+        self.profile_path = profile_path
+        self.started = time.perf_counter()
+        self._requests = {}  # endpoint -> {"latency": Histogram, "bytes": int, "status": {code: n}}
+        self._stages = {}  # name -> StageTimer
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._thread_profilers = []
+        if profile_path:
+            # 之后启动的每个线程第一次触发 profile 事件时换上自己的 cProfile，结束时合并
+            threading.setprofile(self._profile_thread)
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def _profile_thread(self, frame, event, arg):
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ 的 cProfile 基于 sys.monitoring，同一时间只能有一个，主线程的剖析器已经覆盖所有线程
+            return
+        with self._lock:
+            self._thread_profilers.append(profiler)
+
+    def observe_request(self, method, url, status, seconds, nbytes):
+        key = endpoint_name(method, url)
+        with self._lock:
+            entry = self._requests.get(key)
+            if entry is None:
+                entry = self._requests[key] = {"latency": Histogram(), "bytes": 0, "status": {}}
+            entry["latency"].add(seconds)
+            entry["bytes"] += nbytes
+            entry["status"][status] = entry["status"].get(status, 0) + 1
+
+    @contextmanager
+    def stage(self, name):
+        with self._lock:
+            timer = self._stages.get(name)
+            if timer is None:
+                timer = self._stages[name] = StageTimer()
+            start = time.perf_counter()
+            timer.enter(start)
+        try:
+            yield
+        finally:
+            with self._lock:
+                timer.exit(start, time.perf_counter())
+
+    def add_counters(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    def report(self, client=None):
+        with self._lock:
+            requests_by_endpoint = {
+                key: dict(entry["latency"].summary(), bytes=entry["bytes"],
+                          status={str(code): n for code, n in sorted(entry["status"].items())})
+                for key, entry in sorted(self._requests.items())
+            }
+            now = time.perf_counter()
+            stages = {name: timer.summary(now) for name, timer in self._stages.items()}
+            counters = dict(self._counters)
+            all_latency = Histogram()
+            for entry in self._requests.values():
+                all_latency.merge(entry["latency"])
+            total_bytes = sum(entry["bytes"] for entry in self._requests.values())
+        return {
+            "wall_seconds": round(time.perf_counter() - self.started, 3),
+            "peak_rss_kb": peak_rss_kb(),
+            "http": dict(all_latency.summary(), bytes=total_bytes,
+                         client=client.stats() if client is not None else {}),
+            "requests": requests_by_endpoint,
+            "stages": stages,
+            "counters": counters,
+        }
+
+    def print_summary(self, report, file=None):
+        http = report["http"]
+        print(f"📊 运行 {report['wall_seconds']:.2f}s，峰值内存 "
+              f"{(report['peak_rss_kb'] or 0) / 1024:.1f} MB，HTTP 请求 {http['count']} 次，"
+              f"{http['bytes'] / (1024 * 1024):.2f} MB，p50 {http['p50_ms']} ms，p99 {http['p99_ms']} ms", file=file)
+        for name, stage in sorted(report["stages"].items(), key=lambda item: -item[1]["wall_ms"]):
+            print(f"  ⏱️ {name}: {stage['wall_ms'] / 1000:.2f}s（{stage['count']} 次，"
+                  f"各线程合计 {stage['thread_ms'] / 1000:.2f}s）", file=file)
+
+    def finish(self, client=None):
+        """停止剖析，写出指标文件并打印摘要。"""
+        if self._profiler is not None:
+            threading.setprofile(None)
+            self._profiler.disable()
+            stats = pstats.Stats(self._profiler)
+            with self._lock:
+                thread_profilers, self._thread_profilers = self._thread_profilers, []
+            for profiler in thread_profilers:
+                stats.add(profiler)
+            stats.dump_stats(self.profile_path)
+            print(f"🔬 cProfile 结果已写入 {self.profile_path}（python -m pstats {self.profile_path}）")
+        report = self.report(client)
+        if self.path:
+            with open(self.path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"📊 指标已写入 {self.path}")
+        self.print_summary(report)
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics", type=str, default=None,
+                        help="Write request latency histograms, status codes, bytes, per-stage timings "
+                             "and peak memory to this JSON file")
+    parser.add_argument("--profile", type=str, default=None,
+                        help="Run the main and worker threads under cProfile and dump the merged stats to this file")
+
+
+def metrics_from_args(args):
+    if not args.metrics and not args.profile:
+        return NULL_METRICS
+    return Metrics(args.metrics, args.profile)
@@ -0,0 +1,99 @@
+"""
+GitHub REST API 分页引擎。
+
+第一页就请求最大页大小（per_page=100），从响应的 Link 头里读取 rel="last" 得到总页数，
+然后并发获取剩余页面，并按页码顺序拼接结果。没有 rel="last" 时退回按 rel="next" 逐页翻。
+
+调用方需要按条件提前停止时（见 version_window），传 sequential=True 逐页顺序翻页，
+停止迭代后就不会再请求后续页面。
+
+Docker Hub 的接口（iter_counted_pages）不返回 Link 头，而是在正文里给出 count 和 next：
+用 count 和页大小（page_size）算出总页数，同样并发获取剩余页面。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
+
+MAX_PER_PAGE = 100
+DEFAULT_PAGE_WORKERS = 4
+
+
+def with_query(url, **params):
+    """返回替换/追加了查询参数的新 URL。"""
+    parts = urlsplit(url)
+    query = parse_qs(parts.query, keep_blank_values=True)
+    for key, value in params.items():
+        query[key] = [str(value)]
+    return urlunsplit(parts._replace(query=urlencode(query, doseq=True)))
+
+
+def extract_items(data):
+    """GitHub 接口直接返回列表，其他接口把结果放在 packages/results 字段里。"""
+    if isinstance(data, list):
+        return data
+    return data.get("packages", []) or data.get("results", [])
+
+
+def page_number(url):
+    try:
+        return int(parse_qs(urlsplit(url).query)["page"][0])
+    except (KeyError, ValueError):
+        return None
+
+
+def fetch_page(client, url):
+    r = client.get(url)
+    r.raise_for_status()
+    return r
+
+
+def iter_pages(client, url, per_page=MAX_PER_PAGE, workers=DEFAULT_PAGE_WORKERS, sequential=False):
+    """按页码顺序逐页产出条目列表；第一页之后的页面并发获取（sequential=True 时按需逐页获取）。"""
+    first_url = with_query(url, per_page=per_page)
+    r = fetch_page(client, first_url)
+    yield extract_items(r.json())
+
+    last_page = page_number(r.links.get("last", {}).get("url", ""))
+    if last_page and last_page > 1 and not sequential:
+        urls = [with_query(first_url, page=n) for n in range(2, last_page + 1)]
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            for page in executor.map(lambda u: fetch_page(client, u), urls):
+                yield extract_items(page.json())
+        return
+
+    next_url = r.links.get("next", {}).get("url")
+    while next_url:
+        r = fetch_page(client, next_url)
+        yield extract_items(r.json())
+        next_url = r.links.get("next", {}).get("url")
+
+
+def iter_counted_pages(client, url, page_size=MAX_PER_PAGE, workers=DEFAULT_PAGE_WORKERS, sequential=False):
+    """与 iter_pages 相同，但用于正文带 count/next/results 的接口（Docker Hub）。"""
+    first_url = with_query(url, page_size=page_size)
+    data = fetch_page(client, first_url).json()
+    items = extract_items(data)
+    yield items
+
+    count = data.get("count")
+    if isinstance(count, int) and items and not sequential:
+        last_page = -(-count // page_size)
+        if last_page > 1:
+            urls = [with_query(first_url, page=n) for n in range(2, last_page + 1)]
+            with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+                for page in executor.map(lambda u: fetch_page(client, u), urls):
+                    yield extract_items(page.json())
+        return
+
+    next_url = data.get("next")
+    while next_url:
+        data = fetch_page(client, next_url).json()
+        yield extract_items(data)
+        next_url = data.get("next")
+
+
+def fetch_all(client, url, per_page=MAX_PER_PAGE, workers=DEFAULT_PAGE_WORKERS):
+    """获取所有页面并拼接成一个列表。"""
+    items = []
+    for page in iter_pages(client, url, per_page=per_page, workers=workers):
+        items.extend(page)
+    return items
@@ -0,0 +1,210 @@
+"""
+感知速率限制的请求调度器。
+
+- 读取 X-RateLimit-Remaining / X-RateLimit-Reset / Retry-After，额度耗尽时所有线程一起暂停到重置时间，
+  额度偏低时把剩余额度均摊到重置前的时间里；
+- 令牌桶限制每秒请求数；
+- 遇到 403（速率限制）/429/5xx 时把并发上限减半，连续成功后再逐步加回（AIMD）；
+- 幂等请求（GET/HEAD/PUT/DELETE/OPTIONS）失败后按带抖动的指数退避重试。
+"""
+import random
+import threading
+import time
+
+import requests
+
+from http_client import DEFAULT_READ_TIMEOUT
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+DEFAULT_MAX_RETRIES = 5
+# 剩余额度低于该值时开始按重置时间均摊请求
+LOW_REMAINING = 100
+
+
+class TokenBucket:
+    def __init__(self, rate=None, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate or 1, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self.rate = rate
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                if not self.rate:
+                    return
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """可动态调整上限的并发闸门：受限时减半，连续成功 limit 次后加一。"""
+
+    def __init__(self, max_limit):
+        self.max_limit = max(max_limit, 1)
+        self.limit = self.max_limit
+        self._active = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def on_success(self):
+        with self._cond:
+            self._successes += 1
+            if self.limit < self.max_limit and self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify()
+
+    def on_throttle(self):
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+
+
+class RequestScheduler:
+    def __init__(self, max_concurrency, rate=None, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=1.0, backoff_max=60.0):
+        self.bucket = TokenBucket(rate)
+        self.base_rate = rate
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self.throttled = 0
+        self._pause_until = 0.0
+        self._lock = threading.Lock()
+
+    def _wait_for_pause(self):
+        delay = self._pause_until - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _pause(self, until):
+        with self._lock:
+            self._pause_until = max(self._pause_until, until)
+
+    def _backoff(self, attempt):
+        # full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _is_rate_limited(response):
+        if response.status_code == 429:
+            return True
+        if response.status_code != 403:
+            return False
+        if response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers:
+            return True
+        return "rate limit" in response.text.lower()
+
+    def observe(self, response):
+        """根据响应头调整暂停时间与速率；返回建议的重试等待秒数（不重试时为 None）。"""
+        now = time.time()
+        headers = response.headers
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        retry_after = headers.get("Retry-After")
+
+        wait = None
+        if retry_after:
+            try:
+                wait = float(retry_after)
+            except ValueError:
+                wait = None
+        if remaining is not None and reset is not None:
+            try:
+                remaining, reset = int(remaining), float(reset)
+            except ValueError:
+                remaining = None
+            if remaining == 0:
+                wait = max(wait or 0, reset - now)
+            elif remaining is not None and remaining < LOW_REMAINING and reset > now:
+                # 额度偏低：把剩余请求均摊到重置之前
+                self.bucket.set_rate(remaining / (reset - now))
+            elif remaining is not None and self.bucket.rate != self.base_rate:
+                self.bucket.set_rate(self.base_rate)
+        if wait and wait > 0:
+            self._pause(now + wait)
+
+        if self._is_rate_limited(response) or response.status_code in RETRY_STATUSES:
+            with self._lock:
+                self.throttled += 1
+            self.limiter.on_throttle()
+            return wait
+        self.limiter.on_success()
+        return None
+
+    def execute(self, send, method="GET"):
+        """发送请求（send 为无参函数），按需等待、限速并重试。"""
+        retryable = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            self._wait_for_pause()
+            self.bucket.acquire()
+            self.limiter.acquire()
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout):
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                self.limiter.on_throttle()
+                response = None
+            finally:
+                self.limiter.release()
+
+            if response is not None:
+                wait = self.observe(response)
+                should_retry = self._is_rate_limited(response) or response.status_code in RETRY_STATUSES
+                if not should_retry or not retryable or attempt >= self.max_retries:
+                    return response
+                if wait:
+                    # 暂停已在 observe 中记录，下一轮开始时统一等待
+                    wait = 0
+                else:
+                    wait = self._backoff(attempt)
+            else:
+                wait = self._backoff(attempt)
+
+            with self._lock:
+                self.retries += 1
+            attempt += 1
+            if wait:
+                time.sleep(wait)
+
+
+def add_scheduler_arguments(parser):
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help="Retries for idempotent requests on 403 (rate limit)/429/5xx and connection errors")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Maximum requests per second across all workers (default: unlimited)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_READ_TIMEOUT,
+                        help="Seconds without receiving data before a request times out and is retried; "
+                             "connecting is limited to at most 10 seconds (default: %(default)s)")
+
+
+def scheduler_from_args(args, max_concurrency):
+    return RequestScheduler(max_concurrency, rate=args.rate, max_retries=args.max_retries)
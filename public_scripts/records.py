@@ -0,0 +1,152 @@
+"""
+三个脚本共用的结果记录类型与表格输出。
+
+ImageRecord 用 __slots__ 存一行结果，不再为每行同时保留一个数据 dict 和一个显示用 dict；
+size_mb 和显示用的时间、大小等字符串在用到时才计算，时间格式化的结果缓存在记录上。
+写文件时用 to_dict() 还原成原来的字段和顺序，输出格式不变。
+
+TableRenderer 逐行打印对齐的表格：先用 fit() 扫一遍记录算出列宽（不保存格式化后的单元格），
+或者直接用固定列宽（流式模式，更长的单元格照常输出，只是不再对齐）；
+设置了 --max-column-width 时超出上限的单元格截断。
+"""
+from datetime import datetime
+
+NO_TAGS = "(No Tags)"
+HEADERS = ("Image:Tag", "ID (digest)", "Pushed At", "Size", "Architectures")
+# 流式模式无法预先扫描全部记录，按常见内容的长度对齐：digest 为 sha256: + 64 位，时间为 23 个字符
+STREAM_WIDTHS = (50, 71, 23, 11, 13)
+ELLIPSIS = "…"
+
+
+def format_pushed_at(pushed_at):
+    if pushed_at == "N/A":
+        return "N/A"
+    try:
+        dt_object = datetime.strptime(pushed_at, "%Y-%m-%dT%H:%M:%SZ")
+        return dt_object.strftime("%Y-%m-%d %H:%M:%S UTC")
+    except Exception:
+        return pushed_at
+
+
+class ImageRecord:
+    __slots__ = ("image_name", "tag", "digest", "pushed_at", "size_bytes", "architectures", "_pushed_display")
+
+    def __init__(self, image_name, tag, digest="N/A", pushed_at="N/A", size_bytes=0, architectures=None):
+        self.image_name = image_name
+        self.tag = tag
+        self.digest = digest
+        self.pushed_at = pushed_at
+        self.size_bytes = size_bytes
+        self.architectures = architectures if architectures is not None else []
+        self._pushed_display = None
+
+    @classmethod
+    def no_tags(cls, image_name):
+        """没有任何版本 / 标签的镜像也输出一行，保持输出一致。"""
+        return cls(image_name, NO_TAGS)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("image_name"), data.get("tag"), data.get("digest") or "N/A",
+                   data.get("pushed_at") or "N/A", data.get("size_bytes") or 0, data.get("architectures") or [])
+
+    @property
+    def size_mb(self):
+        return round(self.size_bytes / (1024 * 1024), 2)
+
+    @property
+    def has_tags(self):
+        return self.tag != NO_TAGS
+
+    def to_dict(self):
+        return {
+            "image_name": self.image_name,
+            "tag": self.tag,
+            "digest": self.digest,
+            "pushed_at": self.pushed_at,
+            "size_bytes": self.size_bytes,
+            "size_mb": self.size_mb,
+            "architectures": self.architectures,
+        }
+
+    def pushed_display(self):
+        if self._pushed_display is None:
+            self._pushed_display = format_pushed_at(self.pushed_at)
+        return self._pushed_display
+
+    def cells(self):
+        """表格中的一行（顺序与 HEADERS 相同）。"""
+        if not self.has_tags:
+            return f"{self.image_name}:{NO_TAGS}", "N/A", "N/A", "N/A", "N/A"
+        return (
+            f"{self.image_name}:{self.tag}",
+            self.digest,
+            self.pushed_display(),
+            f"{self.size_mb:.2f} MB" if self.size_bytes else "0.00 MB",
+            ", ".join(self.architectures) or "N/A",
+        )
+
+
+def records_to_dicts(records):
+    return [record.to_dict() for record in records]
+
+
+class TableRenderer:
+    def __init__(self, widths=None, max_width=None, indent="", file=None, header_once=False):
+        self.max_width = max_width
+        self.indent = indent
+        self.file = file
+        # header_once：第一次打印行之前自动打印表头（流式模式事先不知道有没有行）
+        self._header_pending = header_once
+        self.widths = [self._bound(w) for w in widths or (len(h) for h in HEADERS)]
+
+    def _bound(self, width):
+        return min(width, self.max_width) if self.max_width else width
+
+    def fit(self, records):
+        """按记录内容放宽列宽（不超过 max_width）；只保留列宽，不保留格式化后的单元格。"""
+        widths = self.widths
+        for record in records:
+            for index, cell in enumerate(record.cells()):
+                if len(cell) > widths[index]:
+                    widths[index] = self._bound(len(cell))
+        return self
+
+    def _cell(self, value, width):
+        if self.max_width and len(value) > self.max_width:
+            value = value[:self.max_width - 1] + ELLIPSIS
+        return value.ljust(width)
+
+    def print_header(self):
+        print(self.indent + " | ".join(self._cell(h, w) for h, w in zip(HEADERS, self.widths)), file=self.file)
+        print(self.indent + "-+-".join("-" * w for w in self.widths), file=self.file)
+
+    def print_row(self, record):
+        if self._header_pending:
+            self._header_pending = False
+            self.print_header()
+        print(self.indent + " | ".join(self._cell(c, w) for c, w in zip(record.cells(), self.widths)),
+              file=self.file)
+
+    def print_rows(self, records):
+        for record in records:
+            self.print_row(record)
+
+
+def print_table(records, max_width=None):
+    if not records:
+        print("未找到任何标签版本。")
+        return
+    renderer = TableRenderer(max_width=max_width).fit(records)
+    renderer.print_header()
+    renderer.print_rows(records)
+
+
+def stream_renderer(max_width=None):
+    """流式模式下逐行打印的渲染器：固定列宽，缩进两格，跟在 📦 行后面；表头在第一行之前打印一次。"""
+    return TableRenderer(STREAM_WIDTHS, max_width=max_width, indent="  ", header_once=True)
+
+
+def add_table_arguments(parser):
+    parser.add_argument("--max-column-width", type=int, default=None,
+                        help="Truncate table cells wider than this many characters (the result file is not affected)")
@@ -0,0 +1,146 @@
+"""
+registry 的 Bearer token 交换与缓存。
+
+ghcr.io 的 /v2/ 接口不直接接受 GitHub PAT：请求先被 401 拒绝，WWW-Authenticate 头给出
+realm（token 接口）、service 和 scope，需要用 PAT 到 realm 换取该仓库 scope 的短期 token。
+
+RegistryAuth 对每个 registry 只经历一次 401 质询，记下 realm/service 后，新仓库直接换 token；
+token 按 scope 缓存到过期前，所有线程共用，同一 scope 同时只有一个线程去换。
+prefetch 可以在一次交换里请求多个仓库的 scope，减少扫描大量仓库时的往返次数。
+"""
+import re
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import requests
+
+# 提前这么多秒视为过期，避免 token 在请求途中失效
+EXPIRY_MARGIN = 10
+# token 接口未返回 expires_in 时的有效期（distribution 规范的默认值）
+DEFAULT_EXPIRES_IN = 60
+# 一次交换最多请求的 scope 数，避免 URL 过长
+DEFAULT_SCOPE_BATCH = 50
+
+CHALLENGE_PARAM = re.compile(r'(\w+)="([^"]*)"')
+
+
+def repository_scope(repo, actions="pull"):
+    return f"repository:{repo}:{actions}"
+
+
+def parse_challenge(header):
+    """解析 WWW-Authenticate: Bearer realm="...",service="...",scope="..."；不是 Bearer 质询时返回 None。"""
+    if not header or not header.lower().startswith("bearer "):
+        return None
+    params = dict(CHALLENGE_PARAM.findall(header))
+    return params if params.get("realm") else None
+
+
+def registry_key(url):
+    parts = urlsplit(url)
+    return parts.scheme, parts.netloc
+
+
+class RegistryAuth:
+    def __init__(self, client, username=None, password=None, scope_batch=DEFAULT_SCOPE_BATCH):
+        self.client = client
+        self.credentials = (username or "", password) if password else None
+        self.scope_batch = max(scope_batch, 1)
+        self.exchanges = 0
+        self.challenges = 0
+        self._realms = {}  # (scheme, host) -> (realm, service)
+        self._tokens = {}  # (realm, service, scope) -> (token, 过期时刻)
+        self._scope_locks = {}  # (realm, service, scope) -> Lock
+        self._lock = threading.Lock()
+
+    def _cached(self, realm, service, scope):
+        entry = self._tokens.get((realm, service, scope))
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def _scope_lock(self, key):
+        with self._lock:
+            return self._scope_locks.setdefault(key, threading.Lock())
+
+    def _exchange(self, realm, service, scopes):
+        """向 token 接口换取覆盖 scopes 的 token，并按每个 scope 缓存。"""
+        query = [("service", service)] if service else []
+        query += [("scope", scope) for scope in scopes]
+        url = f"{realm}?{urlencode(query)}" if query else realm
+        # token 每次都要新签发，不走 HTTP 条件请求缓存
+        r = self.client.request("GET", url, auth=self.credentials, use_cache=False)
+        r.raise_for_status()
+        data = r.json()
+        token = data.get("token") or data.get("access_token")
+        if not token:
+            raise requests.RequestException(f"token endpoint {realm} returned no token")
+        expires_at = time.monotonic() + int(data.get("expires_in") or DEFAULT_EXPIRES_IN) - EXPIRY_MARGIN
+        with self._lock:
+            self.exchanges += 1
+            for scope in scopes:
+                self._tokens[(realm, service, scope)] = (token, expires_at)
+        return token
+
+    def _token(self, realm, service, scope, stale=None):
+        """返回 scope 的有效 token；stale 为刚被拒绝的 token，不再复用。"""
+        token = self._cached(realm, service, scope)
+        if token and token != stale:
+            return token
+        with self._scope_lock((realm, service, scope)):
+            # 等锁期间其他线程可能已经换好了
+            token = self._cached(realm, service, scope)
+            if token and token != stale:
+                return token
+            return self._exchange(realm, service, [scope])
+
+    def _remember_challenge(self, url, response):
+        challenge = parse_challenge(response.headers.get("WWW-Authenticate"))
+        if challenge is None:
+            return None
+        with self._lock:
+            self.challenges += 1
+            self._realms[registry_key(url)] = (challenge["realm"], challenge.get("service", ""))
+        return challenge
+
+    def request(self, method, url, repo, headers=None, actions="pull"):
+        """
+        带 registry token 发送请求。已知 realm 时直接带上缓存的 token；
+        收到 401 质询时换取（或刷新）token 后重试一次。
+        """
+        scope = repository_scope(repo, actions)
+        headers = dict(headers or {})
+        token = None
+        realm = self._realms.get(registry_key(url))
+        if realm is not None:
+            token = self._token(*realm, scope)
+            headers["Authorization"] = f"Bearer {token}"
+        # registry 的响应不进 ETag 缓存：缓存键含 Authorization，而短期 token 每次运行都不同，
+        # 这些条目不会再命中，只会挤掉 GitHub 版本列表的条目；manifest 由 ManifestStore 按 digest 缓存
+        response = self.client.request(method, url, headers=headers, use_cache=False)
+        if response.status_code != 401:
+            return response
+
+        challenge = self._remember_challenge(url, response)
+        if challenge is None:
+            return response
+        realm, service = challenge["realm"], challenge.get("service", "")
+        headers["Authorization"] = f"Bearer {self._token(realm, service, challenge.get('scope') or scope, token)}"
+        return self.client.request(method, url, headers=headers, use_cache=False)
+
+    def prefetch(self, registry_url, repos, actions="pull"):
+        """
+        为一批仓库预先换取 token：每次交换最多包含 scope_batch 个 scope。
+        还不知道 realm 时先请求 /v2/ 触发一次质询。
+        """
+        key = registry_key(registry_url)
+        if key not in self._realms:
+            r = self.client.request("GET", f"{registry_url}/v2/", use_cache=False)
+            if r.status_code != 401 or self._remember_challenge(registry_url, r) is None:
+                return  # 不需要认证，或不是 Bearer 质询
+        realm, service = self._realms[key]
+        scopes = [repository_scope(repo, actions) for repo in dict.fromkeys(repos)]
+        missing = [scope for scope in scopes if not self._cached(realm, service, scope)]
+        for start in range(0, len(missing), self.scope_batch):
+            self._exchange(realm, service, missing[start:start + self.scope_batch])
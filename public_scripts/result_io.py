@@ -0,0 +1,131 @@
+"""
+结果文件的读写。
+
+ResultWriter 逐条写出记录，支持两种格式：
+- json：与原来 json.dump(results, indent=2) 完全相同的数组格式，但边处理边写；
+- ndjson：每行一条记录。
+配合 --stream 时脚本不再在内存里保留全部行，内存占用与命名空间大小无关。
+iter_records 以流式方式读回这两种格式。
+--store sqlite:path 时记录同时 upsert 到 inventory_store.InventoryStore（见 TeeWriter）。
+"""
+import json
+import re
+
+from records import ImageRecord
+
+FORMATS = ("json", "ndjson")
+READ_CHUNK = 1 << 16
+SEPARATOR = re.compile(r"[\s,]*")
+
+
+def add_output_arguments(parser, default_name):
+    parser.add_argument("--format", choices=FORMATS, default="json",
+                        help="Result file format: a JSON array or one JSON record per line")
+    parser.add_argument("--stream", action="store_true",
+                        help="Write each record as soon as it is processed and keep no rows in memory "
+                             "(no aligned table, no results_json_string output)")
+    parser.add_argument("--output", type=str, default=None,
+                        help=f"Result file path (default: {default_name}.json / {default_name}.ndjson)")
+    parser.add_argument("--store", type=str, default=None,
+                        help="Also upsert every record into an indexed inventory store, e.g. sqlite:inventory.db")
+
+
+def output_path_from_args(args, default_name):
+    return args.output or f"{default_name}.{args.format}"
+
+
+class ResultWriter:
+    def __init__(self, path, fmt="json"):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown result format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.count = 0
+        self._file = open(path, "w")
+        if fmt == "json":
+            self._file.write("[")
+
+    def write(self, record):
+        if isinstance(record, ImageRecord):
+            record = record.to_dict()
+        if self.fmt == "ndjson":
+            self._file.write(json.dumps(record))
+            self._file.write("\n")
+        else:
+            # 逐条写出与 json.dump(list, indent=2) 相同的排版
+            body = json.dumps(record, indent=2).replace("\n", "\n  ")
+            self._file.write(("," if self.count else "") + "\n  " + body)
+        self.count += 1
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.fmt == "json":
+            self._file.write("\n]" if self.count else "]")
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TeeWriter:
+    """把记录同时写给多个 writer；只负责分发，各 writer 由创建者自己关闭。"""
+
+    def __init__(self, *writers):
+        self.writers = [w for w in writers if w is not None]
+
+    @property
+    def count(self):
+        return self.writers[0].count
+
+    def write(self, record):
+        for writer in self.writers:
+            writer.write(record)
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+
+def iter_records(path):
+    """流式读取 JSON 数组或 NDJSON 文件中的记录，不把整个文件读进内存。"""
+    with open(path) as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        if head != "[":
+            # NDJSON：每行一条
+            line = head + f.readline()
+            while line:
+                if line.strip():
+                    yield json.loads(line)
+                line = f.readline()
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = ""
+        pos = 0
+        while True:
+            pos = SEPARATOR.match(buffer, pos).end()
+            if buffer.startswith("]", pos):
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                chunk = f.read(READ_CHUNK)
+                if not chunk:
+                    if buffer[pos:].strip():
+                        raise ValueError(f"truncated JSON array in {path}")
+                    return
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield record
+            pos = end
@@ -0,0 +1,67 @@
+"""
+上一次扫描结果（快照）的读取与索引。
+
+ghcr_results.json 旁边会写一个 ghcr_results.index.json，记录每个镜像对应包的 updated_at。
+增量扫描时，包的 updated_at 没变就直接复用快照中的行，不再请求 versions 接口。
+索引里同时记录生成快照时的版本过滤条件（--since 等），条件不同时不复用。
+快照也可以是 sqlite:path 形式的清单库（见 inventory_store）。
+"""
+import json
+import os
+import sqlite3
+
+from inventory_store import InventoryStore, StoreSnapshot, is_store_spec
+from records import ImageRecord
+from result_io import iter_records
+
+
+def index_path(results_path):
+    root, _ = os.path.splitext(results_path)
+    return f"{root}.index.json"
+
+
+class Snapshot:
+    def __init__(self, rows_by_image=None, package_updated_at=None):
+        self.rows_by_image = rows_by_image or {}
+        self.package_updated_at = package_updated_at or {}
+
+    def reusable_rows(self, image_name, updated_at):
+        """包自上次快照以来没有更新时返回上次的行，否则返回 None。"""
+        if not updated_at or self.package_updated_at.get(image_name) != updated_at:
+            return None
+        return self.rows_by_image.get(image_name)
+
+
+def load_snapshot(results_path, filters=None):
+    """
+    读取上次的结果文件（JSON 数组或 NDJSON）及其索引；任意一个缺失，
+    或者快照的过滤条件与 filters 不同时返回空快照（即全量扫描）。
+    """
+    if is_store_spec(results_path):
+        try:
+            store = InventoryStore.open(results_path, prune=False)
+            if store.filters() != filters:
+                store.close()
+                return Snapshot()
+        except (ValueError, sqlite3.Error):
+            return Snapshot()
+        return StoreSnapshot(store)
+    try:
+        with open(index_path(results_path)) as f:
+            index = json.load(f)
+        if index.get("filters") != filters:
+            return Snapshot()
+        rows_by_image = {}
+        for row in iter_records(results_path):
+            rows_by_image.setdefault(row.get("image_name"), []).append(ImageRecord.from_dict(row))
+    except (OSError, ValueError):
+        return Snapshot()
+    return Snapshot(rows_by_image, index.get("packages", {}))
+
+
+def write_index(results_path, package_updated_at, filters=None):
+    index = {"packages": package_updated_at}
+    if filters is not None:
+        index["filters"] = filters
+    with open(index_path(results_path), "w") as f:
+        json.dump(index, f, indent=2)
@@ -0,0 +1,161 @@
+"""
+比较两次扫描结果（快照），输出变更集。
+
+    python snapshot_diff.py diff ghcr_results.old.json ghcr_results.json
+    python snapshot_diff.py diff sqlite:yesterday.db sqlite:inventory.db --format ndjson --exit-code
+
+输入可以是 JSON 数组、NDJSON 或 sqlite:path 清单库，GHCR 和 Docker Hub 的结果格式相同。
+旧快照只在内存里保留 (image_name, tag) -> (digest, size_bytes) 的索引，新快照逐条流式读取、
+边读边比较，内存占用约为一个快照的索引而不是两份完整的记录。
+变更类型：
+- added：新出现的标签（new_version 表示 digest 在旧快照中不存在，即新推送的版本）；
+- retagged：同一标签指向了新的 digest（标签被移动），带大小变化；
+- removed：消失的标签（version_deleted 表示 digest 在新快照中也不存在，即版本已被删除）。
+(image_name, tag) 不一定唯一：import requests.py 为每个无标签版本各输出一行 latest。
+两边都只比较每个键第一次出现的行，其余行的 digest 仍计入版本的新增 / 删除。
+"""
+import argparse
+import json
+import sqlite3
+import sys
+
+from inventory_store import InventoryStore, is_store_spec
+from records import NO_TAGS
+from result_io import iter_records
+
+NOT_IN_OLD = object()
+
+
+def iter_snapshot(source):
+    """逐条产出快照中的 (image_name, tag, digest, size_bytes)；没有标签的占位行跳过。"""
+    if is_store_spec(source):
+        with InventoryStore.open(source, prune=False) as store:
+            for record in store.iter_records():
+                if record.tag != NO_TAGS:
+                    yield record.image_name, record.tag, record.digest, record.size_bytes or 0
+        return
+    for record in iter_records(source):
+        if record.get("tag") != NO_TAGS:
+            yield (record.get("image_name"), record.get("tag"), record.get("digest") or "N/A",
+                   record.get("size_bytes") or 0)
+
+
+class SnapshotDiff:
+    def __init__(self, old_rows):
+        self.old = {}  # (image_name, tag) -> (digest, size_bytes)
+        self.old_digests = set()
+        for image_name, tag, digest, size_bytes in old_rows:
+            # 同一镜像名、同一 digest 会在很多行里重复出现，intern 后只保留一份字符串
+            digest = sys.intern(digest)
+            self.old.setdefault((sys.intern(image_name), tag), (digest, size_bytes))
+            self.old_digests.add(digest)
+        self.new_digests = set()
+        self.summary = {"added": 0, "retagged": 0, "removed": 0, "unchanged": 0,
+                        "new_versions": 0, "deleted_versions": 0, "size_delta_bytes": 0}
+
+    def compare(self, new_rows):
+        """
+        流式比较新快照，先产出 added / retagged，读完后再产出 removed。
+        比较过的键在 self.old 中标记为 None（而不是删除），新快照里重复出现的键就能跳过。
+        """
+        summary = self.summary
+        new_versions = set()
+        for image_name, tag, digest, size_bytes in new_rows:
+            self.new_digests.add(digest)
+            new_version = digest not in self.old_digests
+            if new_version and digest not in new_versions:
+                new_versions.add(digest)
+                summary["new_versions"] += 1
+            key = (sys.intern(image_name), tag)
+            previous = self.old.get(key, NOT_IN_OLD)
+            if previous is None:
+                continue
+            self.old[key] = None
+            if previous is NOT_IN_OLD:
+                summary["added"] += 1
+                summary["size_delta_bytes"] += size_bytes
+                yield {"type": "added", "image_name": image_name, "tag": tag, "digest": digest,
+                       "size_bytes": size_bytes, "new_version": new_version}
+            elif previous[0] != digest:
+                summary["retagged"] += 1
+                summary["size_delta_bytes"] += size_bytes - previous[1]
+                yield {"type": "retagged", "image_name": image_name, "tag": tag, "old_digest": previous[0],
+                       "new_digest": digest, "size_delta_bytes": size_bytes - previous[1]}
+            else:
+                summary["unchanged"] += 1
+                summary["size_delta_bytes"] += size_bytes - previous[1]
+
+        # 与 new_versions 对称：旧快照里出现过、新快照里一次也没出现的 digest，不论它原来在哪个键上
+        summary["deleted_versions"] = len(self.old_digests - self.new_digests)
+        for (image_name, tag), previous in self.old.items():
+            if previous is None:
+                continue
+            digest, size_bytes = previous
+            version_deleted = digest not in self.new_digests
+            summary["removed"] += 1
+            summary["size_delta_bytes"] -= size_bytes
+            yield {"type": "removed", "image_name": image_name, "tag": tag, "digest": digest,
+                   "size_bytes": size_bytes, "version_deleted": version_deleted}
+        self.old = {}
+
+    @property
+    def changed(self):
+        return bool(self.summary["added"] or self.summary["retagged"] or self.summary["removed"])
+
+
+def write_changes(changes, summary, fmt, out):
+    """json：{"changes": [...], "summary": {...}}（变更逐条写出，摘要最后写）；ndjson：每行一条，最后一行为摘要。"""
+    if fmt == "ndjson":
+        for change in changes:
+            out.write(json.dumps(change) + "\n")
+        out.write(json.dumps(dict(summary, type="summary")) + "\n")
+        return
+    out.write('{\n  "changes": [')
+    count = 0
+    for change in changes:
+        out.write(("," if count else "") + "\n    " + json.dumps(change))
+        count += 1
+    out.write("\n  ],\n" if count else "],\n")
+    out.write('  "summary": ' + json.dumps(summary, indent=2).replace("\n", "\n  ") + "\n}\n")
+
+
+def diff_main(argv):
+    parser = argparse.ArgumentParser(prog="snapshot_diff.py diff",
+                                     description="Compare two scan results and emit the change set.")
+    parser.add_argument("old", help="Previous result file (JSON / NDJSON) or store, e.g. sqlite:inventory.db")
+    parser.add_argument("new", help="Current result file (JSON / NDJSON) or store")
+    parser.add_argument("--format", choices=("json", "ndjson"), default="json")
+    parser.add_argument("--output", type=str, default=None, help="Write the change set to this file (default: stdout)")
+    parser.add_argument("--exit-code", action="store_true",
+                        help="Exit with status 1 when there are changes (like git diff --exit-code)")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        diff = SnapshotDiff(iter_snapshot(args.old))
+        write_changes(diff.compare(iter_snapshot(args.new)), diff.summary, args.format, out)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"错误: 无法读取快照: {e}", file=sys.stderr)
+        sys.exit(2)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    summary = diff.summary
+    print(f"🔀 新增 {summary['added']} 个标签（新版本 {summary['new_versions']} 个），"
+          f"移动 {summary['retagged']} 个，删除 {summary['removed']} 个（版本 {summary['deleted_versions']} 个），"
+          f"大小变化 {summary['size_delta_bytes'] / (1024 * 1024):+.2f} MB", file=sys.stderr)
+    if args.exit_code and diff.changed:
+        sys.exit(1)
+
+
+def main():
+    commands = {"diff": diff_main}
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print(f"用法: python {sys.argv[0]} {{{','.join(commands)}}} ...", file=sys.stderr)
+        sys.exit(2)
+    commands[sys.argv[1]](sys.argv[2:])
+
+
+if __name__ == "__main__":
+    main()
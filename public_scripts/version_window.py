@@ -0,0 +1,126 @@
+"""
+版本的时间窗口 / 数量过滤（--since、--max-versions-per-package、--tagged-only）。
+
+版本接口按时间倒序返回（最新的在前），所以越过 --since 的截止时间或者已经取够
+--max-versions-per-package 个版本之后，后面的页面都不需要了。VersionWindow.select
+在分页迭代的同时过滤，遇到截止条件立即停止迭代；配合 iter_pages(sequential=True)，
+后续页面根本不会被请求。
+"""
+import re
+from datetime import datetime, timedelta, timezone
+
+RELATIVE_SINCE = re.compile(r"(\d+)([mhdw])")
+RELATIVE_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_timestamp(value):
+    """解析 GHCR / Docker Hub 返回的 ISO 8601 时间（带 Z 或时区，可带小数秒），统一为 UTC。"""
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def parse_since(value, now=None):
+    """--since 支持 ISO 日期/时间（2024-05-01、2024-05-01T12:00:00Z）或相对时间（90m、24h、7d、2w）。"""
+    match = RELATIVE_SINCE.fullmatch(value.strip())
+    if match:
+        now = now or datetime.now(timezone.utc)
+        return now - timedelta(**{RELATIVE_UNITS[match.group(2)]: int(match.group(1))})
+    return parse_timestamp(value.strip())
+
+
+def ghcr_version_date(version):
+    # 版本列表按 created_at 排序
+    return version.get("created_at") or version.get("updated_at")
+
+
+def ghcr_version_tagged(version):
+    return bool(version.get("metadata", {}).get("container", {}).get("tags"))
+
+
+class VersionWindow:
+    def __init__(self, since=None, max_versions=None, tagged_only=False):
+        self.since = since
+        self.max_versions = max_versions
+        self.tagged_only = tagged_only
+
+    @property
+    def active(self):
+        return self.since is not None or self.max_versions is not None or self.tagged_only
+
+    @property
+    def stops_early(self):
+        """只有时间和数量限制能提前结束分页；--tagged-only 单独使用时仍要翻完所有页面。"""
+        return self.since is not None or self.max_versions is not None
+
+    def page_size(self, default):
+        """只取最新 N 个版本且不按标签过滤时，第一页请求 N 条就够了。"""
+        if self.max_versions is not None and not self.tagged_only:
+            return min(default, self.max_versions)
+        return default
+
+    def describe(self):
+        """写入快照索引的过滤条件；条件不同的快照不能复用。"""
+        if not self.active:
+            return None
+        return {
+            "since": self.since.strftime("%Y-%m-%dT%H:%M:%SZ") if self.since else None,
+            "max_versions": self.max_versions,
+            "tagged_only": self.tagged_only,
+        }
+
+    def includes(self, value):
+        """时间不早于 --since 时返回 True；没有 --since、没有时间或无法解析时也返回 True。"""
+        if self.since is None or not value:
+            return True
+        try:
+            return parse_timestamp(value) >= self.since
+        except ValueError:
+            return True
+
+    def package_changed_since(self, updated_at):
+        """包的 updated_at 早于 --since 时，它不可能有窗口内的新版本，连第一页都不用取。"""
+        return self.includes(updated_at)
+
+    def select(self, pages, date_of=ghcr_version_date, tagged=ghcr_version_tagged, include=None):
+        """
+        逐页过滤版本（pages 为按时间倒序的页面迭代器），越过截止条件后停止迭代并关闭 pages，
+        不再请求后续页面。date_of 必须是分页排序所用的时间；include 为额外的过滤条件，
+        不满足的版本跳过但不结束迭代，也不计入 --max-versions-per-package。
+        """
+        kept = 0
+        try:
+            for page in pages:
+                for version in page:
+                    if not self.includes(date_of(version)):
+                        return
+                    if self.tagged_only and not tagged(version):
+                        continue
+                    if include is not None and not include(version):
+                        continue
+                    yield version
+                    kept += 1
+                    if self.max_versions is not None and kept >= self.max_versions:
+                        return
+        finally:
+            close = getattr(pages, "close", None)
+            if close is not None:
+                close()
+
+
+def add_window_arguments(parser):
+    parser.add_argument("--since", type=str, default=None,
+                        help="Only list versions pushed at or after this time: an ISO date/time "
+                             "(2024-05-01, 2024-05-01T12:00:00Z) or a relative age (90m, 24h, 7d, 2w)")
+    parser.add_argument("--max-versions-per-package", type=int, default=None,
+                        help="Only list the N newest versions of each package")
+    parser.add_argument("--tagged-only", action="store_true",
+                        help="Skip versions without tags")
+
+
+def window_from_args(args):
+    since = parse_since(args.since) if args.since else None
+    if args.max_versions_per_package is not None and args.max_versions_per_package < 1:
+        raise ValueError("--max-versions-per-package must be at least 1")
+    return VersionWindow(since, args.max_versions_per_package, args.tagged_only)
@@ -0,0 +1,21 @@
+"""
+线程池相关的小工具。
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def ordered_map(fn, items, workers, window=None):
+    """
+    与 executor.map 一样按提交顺序产出结果，但最多只提前提交 window 个任务，
+    已完成却还没被消费的结果不会在内存里无限堆积。
+    """
+    window = window or workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()